@@ -4167,16 +4167,26 @@ Vector_string.__repr__ = lambda self: repr(list(self))
 
 # Global RNG
 
+_numpy_rng = None
+
 def seed_rng(seed):
     """Seed the random number generator used by graph-tool's algorithms. A value
     of ``0`` will cause the system's entropy source to be used as seed."""
+    global _numpy_rng
     libcore.seed_rng(seed)
+    # the sampling done in Python is seeded together with the C++ RNG
+    _numpy_rng = numpy.random.default_rng(seed if seed != 0 else None)
 
 seed_rng(0)
 
 def _get_rng():
     return libcore.get_rng()
 
+def _get_numpy_rng():
+    """Return the :class:`numpy.random.Generator` used by graph-tool's
+    algorithms that sample in Python, which is seeded by :func:`seed_rng`."""
+    return _numpy_rng
+
 from . openmp import *
 
 if openmp_enabled() and os.environ.get("OMP_SCHEDULE") is None:
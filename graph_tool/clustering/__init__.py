@@ -44,20 +44,25 @@ Summary
 from .. dl_import import dl_import
 dl_import("from . import libgraph_tool_clustering as _gt")
 
-from .. import _prop, Graph, GraphView, VertexPropertyMap, _get_rng, _parallel
+from .. import _prop, Graph, GraphView, VertexPropertyMap, _get_rng, \
+    _get_numpy_rng, _parallel, seed_rng, openmp_get_num_threads, \
+    openmp_set_num_threads
 from .. topology import isomorphism
-from .. generation import random_rewire
-from .. stats import vertex_hist
+from .. generation import random_rewire, label_parallel_edges
+from .. spectral import adjacency
 
 from collections import defaultdict
-from numpy import *
+import concurrent.futures
+from numpy import sqrt
+import numpy
 
 __all__ = ["local_clustering", "global_clustering", "extended_clustering",
            "motifs", "motif_significance"]
 
 
 @_parallel
-def local_clustering(g, weight=None, prop=None, undirected=True):
+def local_clustering(g, weight=None, prop=None, undirected=True, sampled=False,
+                     m=1000):
     r"""Return the local clustering coefficients for all vertices.
 
     Parameters
@@ -72,6 +77,15 @@ def local_clustering(g, weight=None, prop=None, undirected=True):
     undirected : bool (default: ``True``)
         Calculate the *undirected* clustering coefficient, if graph is directed
         (this option has no effect if the graph is undirected).
+    sampled : bool (default: ``False``)
+        If ``True`` a much faster sampling estimate is performed, where the
+        clustering coefficient of each vertex is obtained from at most ``m``
+        randomly chosen pairs of its out-edges. In this case the ``weight``
+        option is ignored, and parallel edges are counted as in the exact
+        computation.
+    m : int (default: ``1000``)
+        If ``sampled is True``, this will be the maximum number of samples used
+        for the estimation at each vertex.
 
     Returns
     -------
@@ -115,6 +129,11 @@ def local_clustering(g, weight=None, prop=None, undirected=True):
 
     The implemented algorithm runs in :math:`O(|V|\left<k^2\right>)` time,
     where :math:`\left<k^2\right>` is second moment of the degree distribution.
+    If ``sampled is True``, it runs instead in :math:`O(|V|m\log |E|)` time.
+    With non-negative weights and no parallel edges, it is computed via sparse
+    matrix products if :math:`\sum_i k_i^2 \le 32 \sum_i k_i`, since their
+    memory usage grows as :math:`O(|V|\left<k^2\right>)`; otherwise, a
+    parallel algorithm with :math:`O(|V|)` memory usage is used.
 
     @parallel@
 
@@ -140,11 +159,117 @@ def local_clustering(g, weight=None, prop=None, undirected=True):
         prop = g.new_vertex_property("double")
     if g.is_directed() and undirected:
         g = GraphView(g, directed=False, skip_properties=True)
+
+    # vertices with out-degree smaller than two cannot close any triangle; if
+    # this holds for the whole graph, the kernel does not need to be called.
+    # (These vertices cannot simply be filtered out otherwise, since that would
+    # change the degrees of their neighbors.)
+    deg = g.get_out_degrees(g.get_vertices())
+    if len(deg) == 0 or deg.max() < 2:
+        prop.fa = 0
+        return prop
+
+    if sampled:
+        prop.fa = _local_clustering_sampled(g, m)
+        return prop
+
+    # the weighted coefficients can be obtained from sparse matrix products,
+    # as long as these are not too large, and no parallel edges or negative
+    # weights need to be handled (the degrees bound the number of neighbors,
+    # so the size is checked before looking for parallel edges)
+    if (weight is not None and _spgemm_fits(deg) and weight.fa.min() >= 0 and
+        label_parallel_edges(g, mark_only=True).fa.max() == 0):
+        prop.fa = _local_clustering_weighted(g, weight)
+        return prop
+
     _gt.local_clustering(g._Graph__graph, _prop("v", g, prop),
                          _prop("e", g, weight))
     return prop
 
 
+def _local_clustering_weighted(g, weight):
+    """Compute the weighted local clustering coefficients of ``g``, which should
+    have no parallel edges or negative weights, via sparse matrix products."""
+    # rows of the transposed adjacency matrix are the out-neighborhoods
+    W = adjacency(g, weight=weight).T.tocsr()
+    W.setdiag(0)
+    W.eliminate_zeros()
+    t = numpy.asarray((W @ W).multiply(W).sum(axis=1)).ravel()
+    k = numpy.asarray(W.sum(axis=1)).ravel()
+    k2 = numpy.asarray(W.multiply(W).sum(axis=1)).ravel()
+    n = k * k - k2
+    return numpy.where(n > 0, t / numpy.where(n > 0, n, 1), 0)
+
+
+# maximum number of pair samples that are processed at once
+_sample_block_size = 1 << 22
+
+
+def _local_clustering_sampled(g, m):
+    """Estimate the local clustering coefficients of ``g`` by sampling ``m``
+    ordered pairs of distinct out-edges of each vertex (or enumerating all of
+    them, if there are fewer), and counting the edges between their targets. As
+    in ``_gt.local_clustering()``, parallel edges are counted with their
+    multiplicities, except those to the second target."""
+    # rows of the transposed adjacency matrix are the out-neighborhoods, with
+    # the edge multiplicities as values
+    A = adjacency(g).T.tocsr()
+    A.setdiag(0)
+    A.eliminate_zeros()
+    A.sort_indices()
+    N = A.shape[0]
+    indptr = A.indptr.astype("int64")
+    indices = A.indices.astype("int64")
+    mult = numpy.rint(A.data).astype("int64")
+
+    # sorted edge keys, for vectorized multiplicity lookups
+    keys = numpy.repeat(numpy.arange(N, dtype="int64"),
+                        numpy.diff(indptr)) * N + indices
+
+    def count(q):
+        pos = numpy.minimum(numpy.searchsorted(keys, q), len(keys) - 1)
+        return numpy.where(keys[pos] == q, mult[pos], 0)
+
+    # out-neighbors repeated according to the multiplicities, i.e., the
+    # targets of the out-edges
+    targets = numpy.repeat(indices, mult)
+    tptr = numpy.concatenate(([0], numpy.cumsum(mult)))[indptr]
+    d = numpy.diff(tptr)
+
+    ns = numpy.where(d > 1, numpy.minimum(m, d * (d - 1)), 0)
+    hits = numpy.zeros(N)
+    rng = _get_numpy_rng()
+
+    # process vertices in blocks, to bound the memory used by the samples
+    cum = numpy.cumsum(ns)
+    start = 0
+    while start < N:
+        offset = cum[start - 1] if start > 0 else 0
+        end = max(int(numpy.searchsorted(cum, offset + _sample_block_size,
+                                         side="right")),
+                  start + 1)
+        vs = numpy.repeat(numpy.arange(start, end), ns[start:end])
+        start = end
+        if len(vs) == 0:
+            continue
+        dv = d[vs]
+        # the pairs of edges with at most m of them are enumerated exactly
+        r = numpy.arange(len(vs)) - (cum[vs] - ns[vs] - offset)
+        exact = dv * (dv - 1) <= m
+        i = numpy.where(exact, r // numpy.maximum(dv - 1, 1),
+                        rng.integers(0, dv))
+        j = numpy.where(exact, r % numpy.maximum(dv - 1, 1),
+                        rng.integers(0, dv - 1))
+        j += j >= i
+        u = targets[tptr[vs] + i]
+        w = targets[tptr[vs] + j]
+        # each of the parallel edges to w is drawn, but w is counted only once
+        hits += numpy.bincount(vs, weights=count(u * N + w) / count(vs * N + w),
+                               minlength=N)
+
+    return hits / numpy.maximum(ns, 1)
+
+
 @_parallel
 def global_clustering(g, weight=None, ret_counts=False, sampled=False, m=1000):
     r"""Return the global clustering coefficient.
@@ -202,7 +327,10 @@ def global_clustering(g, weight=None, ret_counts=False, sampled=False, m=1000):
 
     The implemented algorithm runs in time :math:`O(|V|\left<k^2\right>)`,
     where :math:`\left< k^2\right>` is the second moment of the degree
-    distribution.
+    distribution. Without weights, it is computed via sparse matrix products
+    if :math:`\sum_i k_i^2 \le 32 \sum_i k_i`, since their memory usage grows
+    as :math:`O(|V|\left<k^2\right>)`; otherwise, a parallel algorithm with
+    :math:`O(|V|)` memory usage is used.
 
     @parallel@
 
@@ -225,7 +353,11 @@ def global_clustering(g, weight=None, ret_counts=False, sampled=False, m=1000):
     if g.is_directed():
         g = GraphView(g, directed=False, skip_properties=True)
     if not sampled:
-        c = _gt.global_clustering(g._Graph__graph, _prop("e", g, weight))
+        c = None
+        if weight is None:
+            c = _global_clustering_sparse(g)
+        if c is None:
+            c = _gt.global_clustering(g._Graph__graph, _prop("e", g, weight))
     else:
         return _gt.global_clustering_sampled(g._Graph__graph, m, _get_rng())
     if ret_counts:
@@ -234,6 +366,48 @@ def global_clustering(g, weight=None, ret_counts=False, sampled=False, m=1000):
         return c[:2]
 
 
+# maximum ratio between the number of paths of length two, i.e. sum(k * k), and
+# the number of (distinct) edges, i.e. sum(k), for which the clustering
+# coefficients are computed via sparse matrix products, whose size is bounded
+# by the former
+_spgemm_max_ratio = 32
+
+
+def _spgemm_fits(k):
+    """return whether the product of an adjacency matrix with itself, having
+    rows with ``k`` nonzero entries, is within the memory budget."""
+    k = numpy.asarray(k, dtype="float")
+    return (k * k).sum() <= _spgemm_max_ratio * k.sum()
+
+
+def _global_clustering_sparse(g):
+    """Compute the unweighted global clustering coefficient of the undirected
+    graph ``g`` via sparse matrix products, returning the same tuple as
+    ``_gt.global_clustering()``, or ``None`` if the products would be too large
+    (see ``_spgemm_fits()``)."""
+    A = adjacency(g).tocsr()
+    A.setdiag(0)
+    A.eliminate_zeros()
+    if not _spgemm_fits(numpy.diff(A.indptr)):
+        return None
+    B = A.copy()
+    B.data[:] = 1
+
+    # per-vertex triangles and connected triples (counting multiplicities)
+    t = numpy.asarray((A @ A).multiply(B).sum(axis=1)).ravel() / 2
+    k = numpy.asarray(A.sum(axis=1)).ravel()
+    n_v = (k * k - k) / 2
+
+    triangles = t.sum()
+    n = n_v.sum()
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        c = triangles / n
+        # "jackknife" variance
+        cl = (triangles - t) / (n - n_v)
+        c_err = numpy.sqrt(((c - cl) ** 2).sum())
+    return (float(c), float(c_err), int(round(triangles)) // 3, int(round(n)))
+
+
 @_parallel
 def extended_clustering(g, props=None, max_depth=3, undirected=False):
     r"""
@@ -308,7 +482,7 @@ def extended_clustering(g, props=None, max_depth=3, undirected=False):
     """
 
     if g.is_directed() and undirected:
-        g = GraphView(g, directed=False)
+        g = GraphView(g, directed=False, skip_properties=True)
     if props is None:
         props = []
         for i in range(0, max_depth):
@@ -319,7 +493,7 @@ def extended_clustering(g, props=None, max_depth=3, undirected=False):
 
 
 @_parallel
-def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
+def motifs(g, k, p=1.0, motif_list=None, return_maps=False, threshold=0):
     r"""
     Count the occurrence of k-size node-induced subgraphs (motifs). A tuple with
     two lists is returned: the list of motifs found, and the list with their
@@ -343,6 +517,9 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
         If ``True``, a list will be returned, which provides for each motif graph a
         list of vertex property maps which map the motif to its location in the
         main graph.
+    threshold : int (optional, default: 0)
+        If larger than zero, only motifs with a count above this level are
+        returned.
 
     Returns
     -------
@@ -395,8 +572,16 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
     .. [induced-subgraph-isomorphism] http://en.wikipedia.org/wiki/Induced_subgraph_isomorphism_problem
     """
 
+    sub_list = _motif_sub_list(g, k, motif_list)
+    return _motifs(g, k, p, sub_list, return_maps, threshold)
+
+
+def _motif_sub_list(g, k, motif_list):
+    """validate ``motif_list`` against ``g`` and ``k``, and return the list of
+    the underlying graphs to be passed to ``_motifs()``."""
     sub_list = []
-    directed_motifs = g.is_directed()
+    directed = g.is_directed()
+    directed_motifs = directed
 
     if motif_list is not None:
         directed_motifs = motif_list[0].is_directed()
@@ -407,9 +592,19 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
                 raise ValueError("all motifs must have the same number of vertices: %d" % k)
             sub_list.append(m._Graph__graph)
 
-    if directed_motifs != g.is_directed():
+    if directed_motifs != directed:
         raise ValueError("motifs do not have the same directionality as the graph itself!")
 
+    return sub_list
+
+
+def _motifs(g, k, p, sub_list, return_maps=False, threshold=0):
+    """implementation of ``motifs()``, which takes the list of underlying motif
+    graphs, as returned by ``_motif_sub_list()``, so that it can be reused
+    across calls."""
+    # the list is filled by the C++ side if it is empty
+    sub_list = list(sub_list)
+
     if type(p) == float:
         pd = [1.0] * (k - 1)
         pd.append(p)
@@ -418,7 +613,6 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
 
     hist = []
     vertex_maps = []
-    was_directed = g.is_directed()
     _gt.get_motifs(g._Graph__graph, k, sub_list, hist, vertex_maps, return_maps,
                    pd, True, len(sub_list) == 0, _get_rng())
 
@@ -435,14 +629,11 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
         list_hist = list(zip(sub_list, hist, vertex_maps))
     else:
         list_hist = list(zip(sub_list, hist))
-    # sort according to in-degree sequence
-    list_hist.sort(key=lambda x: sorted([v.in_degree() for v in x[0].vertices()]))
-
-    # sort according to out-degree sequence
-    list_hist.sort(key=lambda x: sorted([v.out_degree() for v in x[0].vertices()]))
-
-    # sort according to ascending number of edges
-    list_hist.sort(key=lambda x: x[0].num_edges())
+    if threshold > 0:
+        list_hist = [x for x in list_hist if x[1] > threshold]
+    # sort according to ascending number of edges, out-degree sequence, and
+    # in-degree sequence (in this order of precedence)
+    list_hist.sort(key=lambda x: _motif_sort_key(x[0]))
 
     sub_list = [x[0] for x in list_hist]
     hist = [x[1] for x in list_hist]
@@ -456,24 +647,59 @@ def motifs(g, k, p=1.0, motif_list=None, return_maps=False):
     return sub_list, hist
 
 
+def _motif_sort_key(g):
+    """return the key used to sort motif graphs, i.e., the number of edges,
+    the out-degree sequence and the in-degree sequence, as a tuple."""
+    vs = g.get_vertices()
+    return (g.num_edges(),
+            tuple(sorted(g.get_out_degrees(vs).tolist())),
+            tuple(sorted(g.get_in_degrees(vs).tolist())))
+
+
 def _graph_sig(g):
-    """return the graph signature, i.e., the in and out degree distribution as
-    concatenated as a tuple."""
-    bins = list(range(0, g.num_vertices() + 1))
-    in_dist = vertex_hist(g, "in", bins=bins if g.is_directed() else [0, 1],
-                          float_count=False)
-    out_dist = vertex_hist(g, "out", bins=bins, float_count=False)
-    sig = tuple([(in_dist[1][i], in_dist[0][i]) for \
-                 i in range(len(in_dist[0]))] +
-                [(out_dist[1][i], out_dist[0][i]) for\
-                 i in range(len(out_dist[0]))])
-    return sig
+    """return the graph signature, i.e., the sorted sequence of the in and out
+    degrees of each vertex, together with the sorted degrees of its neighbors,
+    as a tuple. Isomorphic graphs always have the same signature, and for small
+    motifs non-isomorphic graphs rarely do."""
+    vs = g.get_vertices()
+    k_in = g.get_in_degrees(vs).tolist()
+    k_out = g.get_out_degrees(vs).tolist()
+    directed = g.is_directed()
+    sig = []
+    for v in vs.tolist():
+        us = [(k_in[u], k_out[u]) for u in g.get_out_neighbors(v).tolist()]
+        ws = [(k_in[u], k_out[u]) for u in g.get_in_neighbors(v).tolist()] \
+            if directed else []
+        sig.append((k_in[v], k_out[v], tuple(sorted(us)), tuple(sorted(ws))))
+    return tuple(sorted(sig))
+
+
+def _shuffled_motifs(g, k, p, sub_list, threshold, n_shuffles, rewire_args):
+    """yield the motifs and their counts for a sequence of ``n_shuffles``
+    successive shufflings of a copy of ``g``."""
+    sg = g.copy()
+    for i in range(0, n_shuffles):
+        random_rewire(sg, **rewire_args)
+        m_temp, count_temp = _motifs(sg, k, p, sub_list, threshold=threshold)
+        yield m_temp, count_temp
+
+
+def _shuffled_motifs_worker(g, k, p, motif_list, threshold, n_shuffles,
+                            rewire_args, seed, n_threads):
+    """same as ``_shuffled_motifs()``, but run in a separate process with its own
+    RNG seed and ``n_threads`` OpenMP threads, returning a list."""
+    seed_rng(seed)
+    openmp_set_num_threads(n_threads)
+    sub_list = _motif_sub_list(g, k, motif_list)
+    return list(_shuffled_motifs(g, k, p, sub_list, threshold, n_shuffles,
+                                 rewire_args))
 
 
 @_parallel
 def motif_significance(g, k, n_shuffles=100, p=1.0, motif_list=None,
                        threshold=0, self_loops=False, parallel_edges=False,
-                       full_output=False, shuffle_model="configuration"):
+                       full_output=False, shuffle_model="configuration",
+                       n_workers=None):
     r"""
     Obtain the motif significance profile, for subgraphs with k vertices. A
     tuple with two lists is returned: the list of motifs found, and their
@@ -510,6 +736,11 @@ def motif_significance(g, k, n_shuffles=100, p=1.0, motif_list=None,
     shuffle_model : string (optional, default: "configuration")
         Shuffle model to use. See :func:`~graph_tool.generation.random_rewire`
         for details.
+    n_workers : int (optional, default: ``None``)
+        If larger than one, the shuffled networks are sampled in this many
+        separate processes, each performing an independent sequence of shuffles
+        starting from the original graph. Otherwise, a single sequence of
+        shuffles is performed in the current process.
 
     Returns
     -------
@@ -565,59 +796,78 @@ def motif_significance(g, k, n_shuffles=100, p=1.0, motif_list=None,
        :doi:`10.1109/TCBB.2006.51`
     """
 
-    s_ms, counts = motifs(g, k, p, motif_list)
-    if threshold > 0:
-        s_ms, counts = list(zip(*[x for x in zip(s_ms, counts) if x[1] > threshold]))
-        s_ms = list(s_ms)
-        counts = list(counts)
+    sub_list = _motif_sub_list(g, k, motif_list)
+    s_ms, counts = _motifs(g, k, p, sub_list, threshold=threshold)
     s_counts = [0] * len(s_ms)
     s_dev = [0] * len(s_ms)
 
-    # group subgraphs by number of edges
+    # group subgraphs by signature, so that only the (typically single)
+    # candidate with the same signature needs to be checked for isomorphism
     m_e = defaultdict(lambda: [])
     for i in range(len(s_ms)):
         m_e[_graph_sig(s_ms[i])].append(i)
 
+    # If motif_list is given, the motifs returned by motifs() wrap the
+    # underlying graphs of its elements, so their signatures are memoized by
+    # identity. (Since the elements of motif_list are kept alive, their ids
+    # cannot be reused by other objects.)
+    sig_cache = {}
+    if motif_list is not None:
+        for m in motif_list:
+            sig_cache[id(m._Graph__graph)] = _graph_sig(m)
+
     # get samples
-    sg = g.copy()
-    for i in range(0, n_shuffles):
-        random_rewire(sg, model=shuffle_model, self_loops=self_loops,
-                      parallel_edges=parallel_edges)
-        m_temp, count_temp = motifs(sg, k, p, motif_list)
-        if threshold > 0:
-            m_temp, count_temp = list(zip(*[x for x in zip(m_temp, count_temp) \
-                                       if x[1] > threshold]))
+    rewire_args = dict(model=shuffle_model, self_loops=self_loops,
+                       parallel_edges=parallel_edges)
+    if n_workers is None or n_workers <= 1:
+        samples = _shuffled_motifs(g, k, p, sub_list, threshold, n_shuffles,
+                                   rewire_args)
+    else:
+        n_workers = min(n_workers, n_shuffles)
+        chunks = [n_shuffles // n_workers + int(i < n_shuffles % n_workers)
+                  for i in range(n_workers)]
+        seeds = _get_numpy_rng().integers(1, 2 ** 31, size=n_workers).tolist()
+        # split the threads among the workers, to avoid oversubscription
+        n_threads = max(openmp_get_num_threads() // n_workers, 1)
+        with concurrent.futures.ProcessPoolExecutor(n_workers) as executor:
+            futures = [executor.submit(_shuffled_motifs_worker, g, k, p,
+                                       motif_list, threshold, n, rewire_args,
+                                       seed, n_threads)
+                       for n, seed in zip(chunks, seeds)]
+            samples = [x for f in futures for x in f.result()]
+
+    for m_temp, count_temp in samples:
         for j in range(0, len(m_temp)):
             found = False
-            for l in m_e[_graph_sig(m_temp[j])]:
+            sig = sig_cache.get(id(m_temp[j]._Graph__graph))
+            if sig is None:
+                sig = _graph_sig(m_temp[j])
+            for l in m_e[sig]:
                 if isomorphism(s_ms[l], m_temp[j]):
                     found = True
                     s_counts[l] += count_temp[j]
                     s_dev[l] += count_temp[j] ** 2
+                    break
             if not found:
                 s_ms.append(m_temp[j])
                 s_counts.append(count_temp[j])
                 s_dev.append(count_temp[j] ** 2)
                 counts.append(0)
-                m_e[_graph_sig(m_temp[j])].append(len(s_ms) - 1)
-
-    s_counts = [x / float(n_shuffles) for x in s_counts]
-    s_dev = [max((sqrt(x[0] / float(n_shuffles) - x[1] ** 2), 1)) \
-              for x in zip(s_dev, s_counts)]
-
-    list_hist = list(zip(s_ms, s_counts, s_dev))
-    # sort according to in-degree sequence
-    list_hist.sort(key = lambda x: sorted([v.in_degree() for v in x[0].vertices()])),
+                m_e[sig].append(len(s_ms) - 1)
 
-    # sort according to out-degree sequence
-    list_hist.sort(key = lambda x: sorted([v.out_degree() for v in x[0].vertices()]))
+    s_counts = numpy.asarray(s_counts, dtype="float64") / n_shuffles
+    s_dev = numpy.asarray(s_dev, dtype="float64") / n_shuffles - s_counts ** 2
+    s_dev = numpy.maximum(sqrt(numpy.clip(s_dev, 0, None)), 1)
 
-    # sort according to ascending number of edges
-    list_hist.sort(key = lambda x: x[0].num_edges())
+    list_hist = list(zip(s_ms, s_counts.tolist(), s_dev.tolist()))
+    # sort according to ascending number of edges, out-degree sequence, and
+    # in-degree sequence (in this order of precedence)
+    list_hist.sort(key=lambda x: _motif_sort_key(x[0]))
 
     s_ms, s_counts, s_dev = list(zip(*list_hist))
 
-    zscore = [(x[0] - x[1]) / x[2] for x in zip(counts, s_counts, s_dev)]
+    zscore = ((numpy.asarray(counts, dtype="float64") -
+               numpy.asarray(s_counts)) / numpy.asarray(s_dev)).tolist()
 
     if full_output:
         return s_ms, zscore, counts, s_counts, s_dev
@@ -39,6 +39,15 @@ Interface to the Netzschleuder online network repository
     each graph are given in the :data:`ns_info` dictionary, or alternatively in
     the graph properties which accompanies each graph object.
 
+    Downloaded files are kept in an on-disk cache under
+    ``$XDG_CACHE_HOME/graph_tool/netzschleuder`` (``~/.cache`` by default),
+    and are revalidated with a conditional request on subsequent accesses,
+    so that unchanged datasets are not transferred again. The location can be
+    changed by setting ``graph_tool.collection.netzschleuder.cache_dir``, or
+    the cache disabled by setting it to ``None``.
+
+    Several networks can be downloaded concurrently with
+    ``ns.prefetch(names, max_workers=8)``.
 
     Examples
     ++++++++
@@ -68,6 +77,16 @@ Built-in collection of empirical network data
     or alternatively in the ``"description"`` graph property which accompanies
     each graph object.
 
+    Loaded graphs are kept in memory and returned again on repeated access. The
+    cache can be released with ``data.evict(name)``, or ``data.evict()`` to
+    drop every loaded graph.
+
+    If the environment variable ``GRAPH_TOOL_COLLECTION_CACHE`` is set to
+    ``1``, an uncompressed copy of each dataset is stored under
+    ``$XDG_CACHE_HOME/graph_tool/collection`` (``~/.cache`` by default) when
+    it is first loaded, and is used instead of the compressed file in
+    subsequent sessions.
+
     Examples
     ++++++++
     >>> g = gt.collection.data["karate"]
@@ -287,6 +306,11 @@ Built-in collection of empirical network data
 Functions returning small graphs
 ================================
 
+Except for :func:`LCF_graph`, each of these functions builds its graph only
+once, and returns a new copy of it on every call. Passing ``copy=False``
+returns the shared instance instead, which avoids the copy but must not be
+modified.
+
 .. autosummary::
    :nosignatures:
    :toctree: autosummary
@@ -320,7 +344,8 @@ Small graph atlas
 .. data:: atlas
 
     Lazy list of of all graphs with up to seven nodes named in the
-    Graph Atlas [atlas]_.
+    Graph Atlas [atlas]_. Each graph is only constructed when it is accessed
+    for the first time.
 
     The graphs are listed in increasing according to
 
@@ -345,11 +370,23 @@ Small graph atlas
 """
 
 import os.path
-import textwrap
 import gzip
 import io
+import struct
+import json
+import collections.abc
+import concurrent.futures
+import importlib
+import pickle
+import tempfile
+import contextlib
 from .. import load_graph
 
+try:
+    from isal import igzip, igzip_threaded
+except ImportError:
+    igzip = igzip_threaded = None
+
 __all__ = ["data", "descriptions", "ns", "ns_info", "atlas", "LCF_graph",
            "bull_graph", "chvatal_graph", "cubical_graph", "desargues_graph",
            "diamond_graph", "dodecahedral_graph", "frucht_graph",
@@ -361,32 +398,55 @@ __all__ = ["data", "descriptions", "ns", "ns_info", "atlas", "LCF_graph",
 
 base_dir = os.path.dirname(__file__)
 
-descriptions = {
-    'adjnoun': "Word adjacencies: adjacency network of common adjectives and nouns in the novel David Copperfield by Charles Dickens. Please cite M. E. J. Newman, Phys. Rev. E 74, 036104 (2006). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'as-22july06': "Internet: a symmetrized snapshot of the structure of the Internet at the level of autonomous systems, reconstructed from BGP tables posted by the `University of Oregon Route Views Project <http://routeviews.org/>`_. This snapshot was created by Mark Newman from data for July 22, 2006 and is not previously published. Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'astro-ph': "Astrophysics collaborations: weighted network of coauthorships between scientists posting preprints on the Astrophysics E-Print Archive between Jan 1, 1995 and December 31, 1999. Please cite M. E. J. Newman, Proc. Natl. Acad. Sci. USA 98, 404-409 (2001). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'celegansneural': "Neural network: A directed, weighted network representing the neural network of C. Elegans. Data compiled by D. Watts and S. Strogatz and made available on the web `here <http://cdg.columbia.edu/cdg/datasets>`_. Please cite D. J. Watts and S. H. Strogatz, Nature 393, 440-442 (1998). Original experimental data taken from J. G. White, E. Southgate, J. N. Thompson, and S. Brenner, Phil. Trans. R. Soc. London 314, 1-340 (1986). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'cond-mat': "Condensed matter collaborations 1999: weighted network of coauthorships between scientists posting preprints on the Condensed Matter E-Print Archive between Jan 1, 1995 and December 31, 1999. Please cite M. E. J. Newman, The structure of scientific collaboration networks, Proc. Natl. Acad. Sci. USA 98, 404-409 (2001). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'cond-mat-2003': "Condensed matter collaborations 2003: updated network of coauthorships between scientists posting preprints on the Condensed Matter E-Print Archive. This version includes all preprints posted between Jan 1, 1995 and June 30, 2003. The largest component of this network, which contains 27519 scientists, has been used by several authors as a test-bed for community-finding algorithms for large networks; see for example J. Duch and A. Arenas, Phys. Rev. E 72, 027104 (2005). These data can be cited as M. E. J. Newman, Proc. Natl. Acad. Sci. USA 98, 404-409 (2001). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'cond-mat-2005': "Condensed matter collaborations 2005: updated network of coauthorships between scientists posting preprints on the Condensed Matter E-Print Archive. This version includes all preprints posted between Jan 1, 1995 and March 31, 2005. Please cite M. E. J. Newman, Proc. Natl. Acad. Sci. USA 98, 404-409 (2001). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'dolphins': "Dolphin social network: an undirected social network of frequent associations between 62 dolphins in a community living off Doubtful Sound, New Zealand. Please cite D. Lusseau, K. Schneider, O. J. Boisseau, P. Haase, E. Slooten, and S. M. Dawson, Behavioral Ecology and Sociobiology 54, 396-405 (2003). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'email-Enron': 'Enron email communication network covers all the email communication within a dataset of around half million emails. This data was originally made public, and posted to the web, by the Federal Energy Regulatory Commission during its investigation. Nodes of the network are email addresses and if an address i sent at least one email to address j, the graph contains an undirected edge from i to j. Note that non-Enron email addresses act as sinks and sources in the network as we only observe their communication with the Enron email addresses. The Enron email data was `originally released <http://www.cs.cmu.edu/~enron/>`_ by William Cohen at CMU. This version was retrieved from the SNAP database at http://snap.stanford.edu/data/email-Enron.html. Please cite: J. Leskovec, K. Lang, A. Dasgupta, M. Mahoney. Community Structure in Large Networks: Natural Cluster Sizes and the Absence of Large Well-Defined Clusters. Internet Mathematics 6(1) 29--123, 2009,  B. Klimmt, Y. Yang. Introducing the Enron corpus. CEAS conference, 2004.',
-    'football': "American College football: network of American football games between Division IA colleges during regular season Fall 2000. Please cite M. Girvan and M. E. J. Newman, Proc. Natl. Acad. Sci. USA 99, 7821-7826 (2002). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'hep-th': "High-energy theory collaborations: weighted network of coauthorships between scientists posting preprints on the High-Energy Theory E-Print Archive between Jan 1, 1995 and December 31, 1999. Please cite M. E. J. Newman, Proc. Natl. Acad. Sci. USA 98, 404-409 (2001). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'karate': "Zachary's karate club: social network of friendships between 34 members of a karate club at a US university in the 1970s. Please cite W. W. Zachary, An information flow model for conflict and fission in small groups, Journal of Anthropological Research 33, 452-473 (1977). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'lesmis': "Les Miserables: coappearance network of characters in the novel Les Miserables. Please cite D. E. Knuth, The Stanford GraphBase: A Platform for Combinatorial Computing, Addison-Wesley, Reading, MA (1993). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'netscience': "Coauthorships in network science: coauthorship network of scientists working on network theory and experiment, as compiled by M. Newman in May 2006. A figure depicting the largest component of this network can be found `here <http://www-personal.umich.edu/~mejn/centrality/>`_. These data can be cited as M. E. J. Newman, Phys. Rev. E 74, 036104 (2006). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'pgp-strong-2009': 'Strongly connected component of the PGP web of trust circa November 2009. The full data is available at http://key-server.de/dump/. Please cite: Richters O, Peixoto TP (2011) Trust Transitivity in Social Networks. PLoS ONE 6(4): e18384. :doi:`10.1371/journal.pone.0018384`.',
-    'polblogs': 'Political blogs: A directed network of hyperlinks between weblogs on US politics, recorded in 2005 by Adamic and Glance. Please cite L. A. Adamic and N. Glance, "The political blogosphere and the 2004 US Election", in Proceedings of the WWW-2005 Workshop on the Weblogging Ecosystem (2005). Retrieved from `Mark Newman\'s website <http://www-personal.umich.edu/~mejn/netdata/>`_.',
-    'polbooks': "Books about US politics: A network of books about US politics published around the time of the 2004 presidential election and sold by the online bookseller Amazon.com. Edges between books represent frequent copurchasing of books by the same buyers. The network was compiled by V. Krebs and is unpublished, but can found on Krebs' `web site <http://www.orgnet.com/>`_. Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'power': "Power grid: An undirected, unweighted network representing the topology of the Western States Power Grid of the United States. Data compiled by D. Watts and S. Strogatz and made available on the web `here <http://cdg.columbia.edu/cdg/datasets>`_. Please cite D. J. Watts and S. H. Strogatz, Nature 393, 440-442 (1998). Retrieved from `Mark Newman's website <http://www-personal.umich.edu/~mejn/netdata/>`_.",
-    'serengeti-foodweb': 'Plant and mammal food web from the Serengeti savanna ecosystem in Tanzania. Please cite: Baskerville EB, Dobson AP, Bedford T, Allesina S, Anderson TM, et al. (2011) Spatial Guilds in the Serengeti Food Web Revealed by a Bayesian Group Model. PLoS Comput Biol 7(12): e1002321. :doi:`10.1371/journal.pcbi.1002321`'
-}
+def _load_descriptions():
+    src = base_dir + "/descriptions.json.gz"
+    cache = base_dir + "/__pycache__/descriptions.pickle"
+    try:
+        if os.path.getmtime(cache) >= os.path.getmtime(src):
+            with open(cache, "rb") as f:
+                return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    with gzip.open(src, "rt", encoding="utf-8") as f:
+        d = json.load(f)
+    # store a pickled copy for faster loading, if the location is writable
+    tmp = None
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cache))
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(d, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache)
+    except OSError:
+        if tmp is not None:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+    return d
 
 def get_data_path(name):
     r"""Return the full path of the corresponding dataset."""
     return base_dir + "/" + name + ".gt.gz"
 
+def _get_cache_path(name):
+    if os.environ.get("GRAPH_TOOL_COLLECTION_CACHE", "0") != "1":
+        return None
+    st = os.stat(get_data_path(name))
+    cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME",
+                                            os.path.expanduser("~/.cache")),
+                             "graph_tool", "collection")
+    return os.path.join(cache_dir,
+                        f"{name}-{st.st_size:x}-{st.st_mtime_ns:x}.gt")
+
+def _store_cache(g, path):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        g.save(tmp, fmt="gt")
+        os.replace(tmp, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+
 class LazyDataDict(dict):
     def __contains__(self, k):
         if not super().__contains__(k):
@@ -394,68 +454,163 @@ class LazyDataDict(dict):
             return os.path.exists(fname)
         return True
     def __getitem__(self, k):
-        if not super().__contains__(k):
-            fname = get_data_path(k)
-            if not os.path.exists(fname):
-                raise KeyError(k)
-            g = load_graph(fname)
-            dict.__setitem__(self, k, g)
+        g = dict.get(self, k)
+        if g is not None:
             return g
-        return dict.__getitem__(self, k)
+        fname = get_data_path(k)
+        if not os.path.exists(fname):
+            raise KeyError(k)
+        cache = _get_cache_path(k)
+        if cache is not None and os.path.exists(cache):
+            g = load_graph(cache, fmt="gt")
+        else:
+            if igzip_threaded is not None:
+                with igzip_threaded.open(fname, "rb") as f:
+                    g = load_graph(f, fmt="gt")
+            else:
+                g = load_graph(fname, fmt="gt")
+            if cache is not None:
+                _store_cache(g, cache)
+        dict.__setitem__(self, k, g)
+        return g
     def keys(self):
-        return descriptions.keys()
+        return _get_lazy("descriptions").keys()
     def items(self):
+        """Iterate over the ``(name, graph)`` pairs, loading each graph only
+        when it is reached. This is a one-shot generator, not a ``dict_items``
+        view; use :meth:`as_dict` to load all graphs at once."""
         for k in self.keys():
-            self[k]  # force loading of lazy items
-        return dict.items(self)
-
-data = LazyDataDict()
+            yield k, self[k]
+    def as_dict(self):
+        """Load all graphs, and return them in a :class:`dict` keyed by
+        name."""
+        return {k: self[k] for k in self.keys()}
+    def evict(self, k=None):
+        """Drop the cached graph ``k``, or all cached graphs if ``k`` is
+        ``None``. They will be loaded again from disk on next access."""
+        if k is None:
+            dict.clear(self)
+        else:
+            dict.pop(self, k, None)
+
+def _load_metadata():
+    try:
+        with open(base_dir + "/metadata.json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 def _update_descriptions():
-    for k, g in data.items():
+    descriptions = _get_lazy("descriptions")
+    metadata = {}
+    data = _get_lazy("data")
+    keys = list(data.keys())
+    with concurrent.futures.ThreadPoolExecutor() as ex:
+        graphs = list(ex.map(data.__getitem__, keys))
+    for k, g in zip(keys, graphs):
         descriptions[k] = g.gp["description"]
+        metadata[k] = dict(N=g.num_vertices(), E=g.num_edges(),
+                           directed=g.is_directed())
+    with gzip.GzipFile(base_dir + "/descriptions.json.gz", "wb",
+                       mtime=0) as f:
+        f.write(json.dumps(descriptions, indent=1).encode("utf-8"))
+    with open(base_dir + "/metadata.json", "w") as f:
+        f.write(json.dumps(metadata, indent=1) + "\n")
 
 def _print_table():
+    import textwrap
     print("===================  ===========  ===========  ========  ================================================")
     print("Name                 N            E            Directed  Description")
     print("===================  ===========  ===========  ========  ================================================")
+    data = _get_lazy("data")
+    metadata = _load_metadata()
     for k in sorted(data.keys()):
-        g = data[k]
-        print("  ".join((k.ljust(19), str(g.num_vertices()).ljust(11),
-                         str(g.num_edges()).ljust(11),
-                         str(g.is_directed()).ljust(8))), end="  ")
-        d = textwrap.wrap(descriptions[k], 48, break_long_words=False, break_on_hyphens=False)
+        if k in metadata:
+            N, E, directed = (metadata[k][x] for x in ["N", "E", "directed"])
+        else:
+            g = data[k]
+            N, E, directed = g.num_vertices(), g.num_edges(), g.is_directed()
+        print("  ".join((k.ljust(19), str(N).ljust(11), str(E).ljust(11),
+                         str(directed).ljust(8))), end="  ")
+        d = textwrap.wrap(_get_lazy("descriptions")[k], 48, break_long_words=False, break_on_hyphens=False)
         print(d[0])
         for line in d[1:]:
             print(" " * 57 + line)
     print("===================  ===========  ===========  ========  ================================================")
 
 
-class LazyList(list):
+class LazyList(collections.abc.Sequence):
+    def __init__(self):
+        self._blob = None
+        self._offsets = None
+        self._graphs = None
+
     def _populate(self):
-        if super().__len__() == 0:
-            with gzip.open(base_dir + "/atlas.dat.gz", "rb") as f:
-                while True:
-                    s = int.from_bytes(f.read(4), 'little')
-                    b = f.read(s)
-                    if len(b) == 0:
-                        break
-                    g = load_graph(io.BytesIO(b), fmt="gt")
-                    self.append(g)
+        fname = base_dir + "/atlas.dat.gz"
+        if igzip is not None:
+            f = igzip.open(fname, "rb")
+        else:
+            f = gzip.open(fname, "rb")
+        with f:
+            blob = f.read()
+        offsets = []
+        pos = 0
+        unpack = struct.Struct("<I").unpack_from
+        while pos + 4 <= len(blob):
+            s, = unpack(blob, pos)
+            if s == 0:
+                break
+            offsets.append((pos + 4, s))
+            pos += 4 + s
+        self._blob = blob
+        self._offsets = offsets
+        self._graphs = [None] * len(offsets)
 
     def __len__(self):
-        self._populate()
-        return super().__len__()
+        if self._graphs is None:
+            self._populate()
+        return len(self._graphs)
 
     def __getitem__(self, i):
-        self._populate()
-        return super().__getitem__(i)
-
-    def __iter__(self):
-        self._populate()
-        return super().__iter__()
-
-atlas = LazyList()
+        if self._graphs is None:
+            self._populate()
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self._graphs)))]
+        g = self._graphs[i]
+        if g is None:
+            pos, s = self._offsets[i]
+            g = load_graph(io.BytesIO(self._blob[pos:pos + s]), fmt="gt")
+            self._graphs[i] = g
+        return g
+
+def _get_ns(name):
+    netzschleuder = importlib.import_module(".netzschleuder", __name__)
+    return getattr(netzschleuder, name)
+
+# module attributes that are only created when first accessed
+_lazy = {"descriptions": _load_descriptions,
+         "data": LazyDataDict,
+         "atlas": LazyList,
+         "ns": lambda: _get_ns("ns"),
+         "ns_info": lambda: _get_ns("ns_info")}
+
+def _get_lazy(name):
+    v = globals().get(name)
+    if v is None:
+        v = globals().setdefault(name, _lazy[name]())
+    return v
+
+def __getattr__(name):
+    if name in _lazy:
+        return _get_lazy(name)
+    if not name.startswith("_"):
+        # remaining public names of the netzschleuder interface
+        netzschleuder = importlib.import_module(".netzschleuder", __name__)
+        if hasattr(netzschleuder, name):
+            return getattr(netzschleuder, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy))
 
-from . netzschleuder import *
 from . small import *
@@ -17,8 +17,13 @@ import urllib.request
 import urllib.parse
 import base64
 import contextlib
+import hashlib
 import json
 import os.path
+import tempfile
+import shutil
+import threading
+import concurrent.futures
 
 from .. import load_graph
 
@@ -27,11 +32,20 @@ try:
 except ImportError:
     pass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 url_prefix = "https://networks.skewed.de"
 
 username = None
 password = None
 
+cache_dir = os.path.join(os.environ.get("XDG_CACHE_HOME",
+                                        os.path.expanduser("~/.cache")),
+                         "graph_tool", "netzschleuder")
+
 def make_ns_req(url, token=None, method="GET"):
     global username, password
 
@@ -50,19 +64,83 @@ def make_ns_req(url, token=None, method="GET"):
 
     return req
 
+def _get_cache_path(url):
+    if cache_dir is None:
+        return None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError:
+        return None
+    if not os.access(cache_dir, os.W_OK):
+        return None
+    return os.path.join(cache_dir,
+                        hashlib.sha256(url.encode("utf-8")).hexdigest())
+
+@contextlib.contextmanager
+def _atomic_open(path):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
 @contextlib.contextmanager
 def open_ns_file(url, token=None):
+    path = _get_cache_path(url)
+    meta = {}
+    if path is not None and os.path.exists(path):
+        try:
+            with open(path + ".meta") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+
     req = make_ns_req(url, token)
-    with urllib.request.urlopen(req) as f:
+    if "ETag" in meta:
+        req.add_header("If-None-Match", meta["ETag"])
+    if "Last-Modified" in meta:
+        req.add_header("If-Modified-Since", meta["Last-Modified"])
+
+    try:
+        f = urllib.request.urlopen(req)
+    except urllib.request.HTTPError as e:
+        if e.code != 304 or len(meta) == 0:
+            raise
+        f = None
+
+    if f is not None:
+        with f:
+            meta = {k: f.headers[k] for k in ["ETag", "Last-Modified"]
+                    if f.headers.get(k) is not None}
+            if path is None or len(meta) == 0:
+                yield f
+                return
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path + ".meta")
+            with _atomic_open(path) as fc:
+                shutil.copyfileobj(f, fc)
+            with _atomic_open(path + ".meta") as fc:
+                fc.write(json.dumps(meta).encode("utf-8"))
+
+    with open(path, "rb") as f:
         yield f
 
+def _json_load(f):
+    if orjson is not None:
+        return orjson.loads(f.read())
+    return json.load(f)
+
 def get_net_url(k):
     if isinstance(k, str):
-        net = k.split("/")
-        if len(net) == 1:
+        entry, sep, net = k.partition("/")
+        if not sep:
             url = f"net/{k}/files/network.gt.zst"
         else:
-            url = f"net/{net[0]}/files/{net[1]}.gt.zst"
+            url = f"net/{entry}/files/{net}.gt.zst"
     else:
         url = f"net/{k[0]}/files/{k[1]}.gt.zst"
     return f"{url_prefix}/{urllib.parse.quote(url)}"
@@ -93,13 +171,14 @@ def check_ns_network(k, token=None):
 def get_ns_info(k):
     url = f"{url_prefix}/api/net/{urllib.parse.quote(k)}"
     with open_ns_file(url) as f:
-        return json.load(f)
+        return _json_load(f)
 
 class LazyNSDataDict(dict):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._keys = None
+        self._lock = threading.Lock()
         self.token = None
         path = os.path.expanduser("~/.gt_token")
         if os.path.exists(path):
@@ -111,7 +190,7 @@ class LazyNSDataDict(dict):
     def sync_keys(self):
         "Download all keys from upstream."
         with open_ns_file(f"{url_prefix}/api/nets?full=True") as f:
-            d = json.load(f)
+            d = _json_load(f)
             self._keys = []
             for k, v in d.items():
                 if len(v["nets"]) == 1:
@@ -143,10 +222,23 @@ class LazyNSDataDict(dict):
                 g = get_ns_network(k, self.token)
             except urllib.error.URLError as e:
                 raise KeyError(str(e))
-            dict.__setitem__(self, k, g)
+            with self._lock:
+                if super().__contains__(k):
+                    return dict.__getitem__(self, k)
+                dict.__setitem__(self, k, g)
             return g
         return dict.__getitem__(self, k)
 
+    def prefetch(self, names, max_workers=8):
+        """Download the networks in ``names`` concurrently, using up to
+        ``max_workers`` threads, so that subsequent accesses are served from
+        memory."""
+        names = [k for k in names if not dict.__contains__(self, k)]
+        if len(names) == 0:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as ex:
+            list(ex.map(self.__getitem__, names))
+
 class LazyNSInfoDict(dict):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -156,12 +248,12 @@ class LazyNSInfoDict(dict):
     def sync_keys(self):
         "Download all keys from upstream."
         with open_ns_file(f"{url_prefix}/api/nets") as f:
-            self._keys = json.load(f)
+            self._keys = _json_load(f)
 
     def sync(self):
         "Download all keys and values from upstream."
         with open_ns_file(f"{url_prefix}/api/nets?full=True") as f:
-            self.update(json.load(f))
+            self.update(_json_load(f))
             self._sync = True
             self._keys = None
 
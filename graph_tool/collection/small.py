@@ -58,6 +58,9 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import numpy
+import functools
+
 from .. import Graph
 from .. generation import circular_graph, complete_graph, remove_parallel_edges
 
@@ -119,14 +122,33 @@ def LCF_graph(n, shift_list, repeats):
     if ne < 1:
         return g
 
-    for i in range(ne):
-        shift = shift_list[i % len(shift_list)]
-        v1 = i % n
-        v2 = (i + shift) % n
-        if g.edge(v1, v2) is None:
-            g.add_edge(v1, v2)
+    i = numpy.arange(ne)
+    shift = numpy.asarray(shift_list, dtype="int64")[i % len(shift_list)]
+    es = numpy.column_stack((i % n, (i + shift) % n))
+
+    # keep only the first occurrence of each new undirected edge
+    def key(es):
+        return es.min(axis=1) * n + es.max(axis=1)
+    _, idx = numpy.unique(key(es), return_index=True)
+    es = es[numpy.sort(idx)]
+    es = es[~numpy.isin(key(es), key(g.get_edges()))]
+    g.add_edge_list(es)
     return g
 
+def _cached_graph(f):
+    """Build the graph returned by ``f`` only once for each set of arguments,
+    and return a copy of it on every call. If ``copy=False`` is passed, the
+    shared instance is returned instead, which must not be modified."""
+    cache = functools.lru_cache(maxsize=None)(f)
+    @functools.wraps(f)
+    def wrapper(*args, copy=True, **kwargs):
+        g = cache(*args, **kwargs)
+        if copy:
+            g = g.copy()
+        return g
+    return wrapper
+
+@_cached_graph
 def petersen_graph():
     """Returns the Petersen graph.
 
@@ -161,6 +183,7 @@ def petersen_graph():
                    7: [9],
                   }, directed=False)
 
+@_cached_graph
 def tutte_graph():
     """Returns the Tutte graph.
 
@@ -228,6 +251,7 @@ def tutte_graph():
                   43: [44],
                   }, directed = False)
 
+@_cached_graph
 def bull_graph():
     """
     Returns the Bull Graph
@@ -252,6 +276,7 @@ def bull_graph():
     return Graph({0: [1, 2], 1: [2, 3], 2: [4]},
                  directed=False)
 
+@_cached_graph
 def chvatal_graph():
     """
     Returns the Chvátal Graph
@@ -286,6 +311,7 @@ def chvatal_graph():
                   8: [10],
                   9: [10, 11]}, directed=False)
 
+@_cached_graph
 def cubical_graph():
     """Returns the 3-regular Platonic Cubical Graph
 
@@ -316,6 +342,7 @@ def cubical_graph():
                   },directed=False)
     return G
 
+@_cached_graph
 def desargues_graph():
     """
     Returns the Desargues Graph
@@ -339,6 +366,7 @@ def desargues_graph():
     """
     return LCF_graph(20, [5, -5, 9, -9], 5)
 
+@_cached_graph
 def diamond_graph():
     """
     Returns the Diamond graph
@@ -359,6 +387,7 @@ def diamond_graph():
     """
     return Graph({0: [1, 2], 1: [2, 3], 2: [3]}, directed=False)
 
+@_cached_graph
 def dodecahedral_graph():
     """
     Returns the Platonic Dodecahedral graph.
@@ -383,6 +412,7 @@ def dodecahedral_graph():
     """
     return LCF_graph(20, [10, 7, 4, -4, -7, 10, -4, 7, -7, 4], 2)
 
+@_cached_graph
 def frucht_graph():
     """Returns the Frucht Graph.
 
@@ -420,6 +450,7 @@ def frucht_graph():
 
 
 
+@_cached_graph
 def heawood_graph():
     """
     Returns the Heawood Graph, a (3,6) cage.
@@ -446,6 +477,7 @@ def heawood_graph():
     """
     return LCF_graph(14, [5, -5], 7)
 
+@_cached_graph
 def hoffman_singleton_graph():
     """
     Returns the Hoffman-Singleton Graph.
@@ -494,6 +526,7 @@ def hoffman_singleton_graph():
     remove_parallel_edges(g)
     return g
 
+@_cached_graph
 def house_graph(x=False):
     """Returns the House graph (square with triangle on top).
 
@@ -524,6 +557,7 @@ def house_graph(x=False):
         g.add_edge_list([(0, 3), (1, 2)])
     return g
 
+@_cached_graph
 def icosahedral_graph():
     """Returns the Platonic Icosahedral graph.
 
@@ -556,6 +590,7 @@ def icosahedral_graph():
                   }, directed=False)
 
 
+@_cached_graph
 def krackhardt_kite_graph():
     """Returns the Krackhardt Kite Social Network.
 
@@ -597,6 +632,7 @@ def krackhardt_kite_graph():
                                 "Fernando", "Garth", "Heather", "Ike", "Jane"])
     return g
 
+@_cached_graph
 def moebius_kantor_graph():
     """Returns the Moebius-Kantor graph.
 
@@ -618,6 +654,7 @@ def moebius_kantor_graph():
     """
     return LCF_graph(16, [5, -5], 8)
 
+@_cached_graph
 def octahedral_graph():
     """
     Returns the Platonic Octahedral graph.
@@ -644,6 +681,7 @@ def octahedral_graph():
     return Graph({0: [1, 2, 3, 4], 1: [2, 3, 5], 2: [4, 5], 3: [4, 5], 4: [5]},
                  directed=False)
 
+@_cached_graph
 def pappus_graph():
     """
     Returns the Pappus graph.
@@ -665,6 +703,7 @@ def pappus_graph():
     """
     return LCF_graph(18, [5, 7, -7, 7, -7, -5], 3)
 
+@_cached_graph
 def sedgewick_maze_graph():
     """
     Return a small maze with a cycle.
@@ -687,6 +726,7 @@ def sedgewick_maze_graph():
     return Graph([[0, 2], [0, 7], [0, 5], [1, 7], [2, 6], [3, 4], [3, 5],
                   [4, 5], [4, 7], [4, 6]], directed=False)
 
+@_cached_graph
 def tetrahedral_graph():
     """
     Returns the 3-regular Platonic Tetrahedral graph.
@@ -709,6 +749,7 @@ def tetrahedral_graph():
     """
     return complete_graph(4)
 
+@_cached_graph
 def truncated_cube_graph():
     """Returns the skeleton of the truncated cube.
 
@@ -755,6 +796,7 @@ def truncated_cube_graph():
                   22: [23],
                   }, directed=False)
 
+@_cached_graph
 def truncated_tetrahedron_graph():
     """Returns the skeleton of the truncated Platonic tetrahedron.
 
@@ -45,7 +45,7 @@ from .. dl_import import dl_import
 dl_import("from . import libgraph_tool_correlations")
 
 from .. import _degree, _prop, _check_prop_scalar, VertexPropertyMap, _parallel
-from numpy import *
+from numpy import asarray
 
 __all__ = ["assortativity", "scalar_assortativity", "corr_hist",
            "combined_corr_hist", "avg_neighbor_corr", "avg_neighbour_corr",
@@ -286,13 +286,13 @@ def corr_hist(g, deg_source, deg_target, bins=[[0, 1], [0, 1]], weight=None,
         Out/out-degree correlation histogram.
     """
 
+    bins = [asarray(b, dtype="float64").tolist() for b in bins]
     ret = libgraph_tool_correlations.\
           vertex_correlation_histogram(g._Graph__graph, _degree(g, deg_source),
                                        _degree(g, deg_target),
                                        _prop("e", g, weight),
-                                       [float(x) for x in bins[0]],
-                                       [float(x) for x in bins[1]])
-    return [array(ret[0], dtype="float64") if float_count else ret[0],
+                                       bins[0], bins[1])
+    return [asarray(ret[0], dtype="float64") if float_count else ret[0],
             [ret[1][0], ret[1][1]]]
 
 
@@ -379,13 +379,13 @@ def combined_corr_hist(g, deg1, deg2, bins=[[0, 1], [0, 1]], float_count=True):
         Combined in/out-degree correlation histogram.
 
     """
+    bins = [asarray(b, dtype="float64").tolist() for b in bins]
     ret = libgraph_tool_correlations.\
           vertex_combined_correlation_histogram(g._Graph__graph,
                                                 _degree(g, deg1),
                                                 _degree(g, deg2),
-                                                [float(x) for x in bins[0]],
-                                                [float(x) for x in bins[1]])
-    return [array(ret[0], dtype="float64") if float_count else ret[0],
+                                                bins[0], bins[1])
+    return [asarray(ret[0], dtype="float64") if float_count else ret[0],
             [ret[1][0], ret[1][1]]]
 
 
@@ -481,7 +481,7 @@ def avg_neighbor_corr(g, deg_source, deg_target, bins=[0, 1], weight=None):
     ret = libgraph_tool_correlations.\
           vertex_avg_correlation(g._Graph__graph, _degree(g, deg_source),
                                  _degree(g, deg_target), _prop("e", g, weight),
-                                 [float(x) for x in bins])
+                                 asarray(bins, dtype="float64").tolist())
     return [ret[0], ret[1], ret[2][0]]
 
 avg_neighbour_corr = avg_neighbor_corr
@@ -566,5 +566,5 @@ def avg_combined_corr(g, deg1, deg2, bins=[0, 1]):
     ret = libgraph_tool_correlations.\
           vertex_avg_combined_correlation(g._Graph__graph, _degree(g, deg1),
                                           _degree(g, deg2),
-                                          [float(x) for x in bins])
+                                          asarray(bins, dtype="float64").tolist())
     return [ret[0], ret[1], ret[2][0]]
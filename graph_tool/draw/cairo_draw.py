@@ -63,11 +63,14 @@ import bz2
 import zipfile
 import copy
 import io
+import concurrent.futures
+import collections
+import hashlib
 from collections import defaultdict
-from scipy.stats import rankdata
 
 from .. import Graph, GraphView, PropertyMap, ungroup_vector_property,\
-     group_vector_property, _prop, _check_prop_vector, map_property_values
+     group_vector_property, _prop, _check_prop_vector, map_property_values, \
+     _get_numpy_rng
 
 from .. generation import label_parallel_edges, label_self_loops
 
@@ -193,35 +196,49 @@ _etypes = {
     "seamless": "bool"
     }
 
+_vattrs = {k: getattr(vertex_attrs, k) for k in _vtypes}
+_eattrs = {k: getattr(edge_attrs, k) for k in _etypes}
+
 for k in list(_vtypes.keys()):
-    _vtypes[getattr(vertex_attrs, k)] = _vtypes[k]
+    _vtypes[_vattrs[k]] = _vtypes[k]
 
 for k in list(_etypes.keys()):
-    _etypes[getattr(edge_attrs, k)] = _etypes[k]
+    _etypes[_eattrs[k]] = _etypes[k]
 
 
 def shape_from_prop(shape, enum):
     if isinstance(shape, PropertyMap):
         g = shape.get_graph()
+        if shape.value_type() == "int32_t":
+            # already in the representation expected by the C++ side; if
+            # every value is a valid enum member, no copy is needed
+            rg = (min(enum.values.keys()),
+                  max(enum.values.keys()))
+            a = shape.fa
+            if len(a) == 0 or (a.min() >= rg[0] and a.max() <= rg[1]):
+                return shape
         if shape.key_type() == "v":
             prop = g.new_vertex_property("int")
-            descs = g.vertices()
         else:
-            descs = g.edges()
             prop = g.new_edge_property("int")
         if shape.value_type() == "string":
+            vals = {}
             def conv(x):
-                return int(getattr(enum, x))
+                i = vals.get(x)
+                if i is None:
+                    i = vals[x] = int(getattr(enum, x))
+                return i
             map_property_values(shape, prop, conv)
         else:
             rg = (min(enum.values.keys()),
                   max(enum.values.keys()))
             g.copy_property(shape, prop)
-            if prop.fa.min() < rg[0]:
-                prop.fa += rg[0]
-            prop.fa -= rg[0]
-            prop.fa %= rg[1] - rg[0] + 1
-            prop.fa += rg[0]
+            a = prop.fa
+            if len(a) > 0 and a.min() >= rg[0]:
+                a -= rg[0]
+            a %= rg[1] - rg[0] + 1
+            a += rg[0]
+            prop.fa = a
         return prop
     if isinstance(shape, str):
         return int(getattr(enum, shape))
@@ -265,26 +282,25 @@ def surface_from_prop(surface):
     if isinstance(surface, PropertyMap):
         if surface.key_type() == "v":
             prop = surface.get_graph().new_vertex_property("object")
-            descs = surface.get_graph().vertices()
         else:
-            descs = surface.get_graph().edges()
             prop = surface.get_graph().new_edge_property("object")
-        surface_map = {}
-        for v in descs:
-            if surface.value_type() == "string":
-                if surface[v] not in surface_map:
-                    sfc = gen_surface(surface[v])
-                    surface_map[surface[v]] = sfc
-                prop[v] = surface_map[surface[v]]
-            elif surface.value_type() == "python::object":
-                if isinstance(surface[v], cairo.Surface):
-                    prop[v] = surface[v]
-                elif surface[v] is not None:
+        if surface.value_type() == "string":
+            surface_map = {}
+            def conv(x):
+                sfc = surface_map.get(x)
+                if sfc is None:
+                    sfc = surface_map[x] = gen_surface(x)
+                return sfc
+        elif surface.value_type() == "python::object":
+            def conv(x):
+                if x is not None and not isinstance(x, cairo.Surface):
                     raise ValueError("Invalid value type for surface property: " +
-                                     str(type(surface[v])))
-            else:
-                raise ValueError("Invalid value type for surface property: " +
-                                 surface.value_type())
+                                     str(type(x)))
+                return x
+        else:
+            raise ValueError("Invalid value type for surface property: " +
+                             surface.value_type())
+        map_property_values(surface, prop, conv)
         return prop
 
     if isinstance(surface, str):
@@ -296,20 +312,22 @@ def surface_from_prop(surface):
 
 def centered_rotation(g, pos, text_pos=True):
     x, y = ungroup_vector_property(pos, [0, 1])
-    cm = (x.fa.mean(), y.fa.mean())
-    dx = x.fa - cm[0]
-    dy = y.fa - cm[1]
-    angle = g.new_vertex_property("double")
-    angle.fa = numpy.arctan2(dy, dx)
+    x, y = x.fa, y.fa
+    dx = x - x.mean()
+    dy = y - y.mean()
+    a = numpy.arctan2(dy, dx, out=dx)
     pi = numpy.pi
-    angle.fa += 2 * pi
-    angle.fa %= 2 * pi
+    a += 2 * pi
+    a %= 2 * pi
+    angle = g.new_vertex_property("double")
     if text_pos:
-        idx = (angle.a > pi / 2 ) * (angle.a < 3 * pi / 2)
+        idx = (a > pi / 2) & (a < 3 * pi / 2)
+        a[idx] += pi
+        angle.fa = a
         tpos = g.new_vertex_property("double")
-        angle.a[idx] += pi
-        tpos.a[idx] = pi
+        tpos.fa = numpy.where(idx, pi, 0.)
         return angle, tpos
+    angle.fa = a
     return angle
 
 def choose_cm(prop, cm):
@@ -345,205 +363,269 @@ def choose_cm(prop, cm):
             cm = matplotlib.cm.magma
     return cm, is_seq
 
-def _convert(attr, val, cmap, vnorm, pmap_default=False, g=None, k=None):
-    try:
-        cmap, alpha = cmap
-    except TypeError:
-        alpha = None
+def _convert_shape(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
+    new_val = shape_from_prop(val, vertex_shape)
+    if pmap_default and not isinstance(val, PropertyMap):
+        new_val = g.new_vertex_property("int", new_val)
+    return new_val
 
-    if attr == vertex_attrs.shape:
-        new_val = shape_from_prop(val, vertex_shape)
-        if pmap_default and not isinstance(val, PropertyMap):
-            new_val = g.new_vertex_property("int", new_val)
-        return new_val
-    elif attr == vertex_attrs.surface:
-        new_val = surface_from_prop(val)
-        if pmap_default and not isinstance(val, PropertyMap):
-            new_val = g.new_vertex_property("python::object", new_val)
-        return new_val
-    elif attr in [edge_attrs.start_marker, edge_attrs.mid_marker,
-                  edge_attrs.end_marker]:
-        new_val = shape_from_prop(val, edge_marker)
-        if pmap_default and not isinstance(val, PropertyMap):
-            new_val = g.new_edge_property("int", new_val)
-        return new_val
-    elif attr in [vertex_attrs.pie_colors]:
-        if isinstance(val, PropertyMap):
-            if val.value_type() in ["vector<double>", "vector<long double>"]:
-                return val
-            if val.value_type() in ["vector<int16_t>", "vector<int32_t>",
-                                    "vector<int64_t>", "vector<bool>"]:
-                g = val.get_graph()
-                new_val = g.new_vertex_property("vector<double>")
+def _convert_surface(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
+    new_val = surface_from_prop(val)
+    if pmap_default and not isinstance(val, PropertyMap):
+        new_val = g.new_vertex_property("python::object", new_val)
+    return new_val
+
+def _convert_marker(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
+    new_val = shape_from_prop(val, edge_marker)
+    if pmap_default and not isinstance(val, PropertyMap):
+        new_val = g.new_edge_property("int", new_val)
+    return new_val
+
+def _convert_pie_colors(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
+    if isinstance(val, PropertyMap):
+        if val.value_type() in ["vector<double>", "vector<long double>"]:
+            return val
+        if val.value_type() in ["vector<int16_t>", "vector<int32_t>",
+                                "vector<int64_t>", "vector<bool>"]:
+            g = val.get_graph()
+            new_val = g.new_vertex_property("vector<double>")
+            vs = list(g.vertices())
+            xs = [numpy.asarray(val[v], dtype="float") for v in vs]
+            x = numpy.concatenate(xs) if len(xs) > 0 else numpy.zeros(0)
+            if len(x) > 0:
+                rg = [x.min(), x.max()]
+            else:
                 rg = [numpy.inf, -numpy.inf]
-                for v in g.vertices():
-                    for x in val[v]:
-                        rg[0] = min(x, rg[0])
-                        rg[1] = max(x, rg[1])
-                if rg[0] == rg[1]:
-                    rg[1] = 1
-                if cmap is None:
-                    cmap = default_cm
+            if rg[0] == rg[1]:
+                rg[1] = 1
+            if cmap is None:
+                cmap = default_cm
+            if isinstance(cmap, matplotlib.colors.Colormap):
+                # map all values at once, and split them per vertex
+                c = numpy.asarray(cmap((x - rg[0]) / (rg[1] - rg[0]),
+                                       alpha=alpha)).reshape(len(x), -1)
+                pos = numpy.cumsum([len(y) for y in xs])[:-1]
+                for v, y in zip(vs, numpy.split(c, pos)):
+                    new_val[v] = y.ravel()
+            else:
                 map_property_values(val, new_val,
                                     lambda y: flatten([cmap((x - rg[0]) / (rg[1] - rg[0]),
                                                             alpha=alpha) for x in y]))
-                return new_val
-            if val.value_type() == "vector<string>":
+            return new_val
+        if val.value_type() == "vector<string>":
+            g = val.get_graph()
+            new_val = g.new_vertex_property("vector<double>")
+            rgba = {}
+            def conv(y):
+                c = []
+                for x in y:
+                    cx = rgba.get(x)
+                    if cx is None:
+                        cx = rgba[x] = color_converter.to_rgba(x)
+                    c.extend(cx)
+                return c
+            map_property_values(val, new_val, conv)
+            return new_val
+        if val.value_type() == "python::object":
+            try:
                 g = val.get_graph()
                 new_val = g.new_vertex_property("vector<double>")
-                map_property_values(val, new_val,
-                                    lambda y: flatten([color_converter.to_rgba(x) for x in y]))
+                def conv(y):
+                    try:
+                        new_val[v] = [float(x) for x in flatten(y)]
+                    except ValueError:
+                        new_val[v] = flatten([color_converter.to_rgba(x) for x in y])
+                map_property_values(val, new_val, conv)
                 return new_val
-            if val.value_type() == "python::object":
-                try:
-                    g = val.get_graph()
-                    new_val = g.new_vertex_property("vector<double>")
-                    def conv(y):
-                        try:
-                            new_val[v] = [float(x) for x in flatten(y)]
-                        except ValueError:
-                            new_val[v] = flatten([color_converter.to_rgba(x) for x in y])
-                    map_property_values(val, new_val, conv)
-                    return new_val
-                except ValueError:
-                    pass
-        else:
+            except ValueError:
+                pass
+        return val
+    else:
+        try:
+            new_val = [float(x) for x in flatten(val)]
+        except ValueError:
             try:
-                new_val = [float(x) for x in flatten(val)]
+                new_val = flatten(color_converter.to_rgba(x) for x in val)
+                new_val = list(new_val)
             except ValueError:
-                try:
-                    new_val = flatten(color_converter.to_rgba(x) for x in val)
-                    new_val = list(new_val)
-                except ValueError:
-                    pass
-            if pmap_default:
-                val_a = numpy.zeros((g.num_vertices(), len(new_val)))
-                for i in range(len(new_val)):
-                    val_a[:, i] = new_val[i]
-                return g.new_vertex_property("vector<double>", val_a)
-            else:
-                return new_val
-    elif attr in [vertex_attrs.color, vertex_attrs.fill_color,
-                  vertex_attrs.text_color, vertex_attrs.text_out_color,
-                  vertex_attrs.halo_color, edge_attrs.color,
-                  edge_attrs.text_color, edge_attrs.text_out_color]:
-        if isinstance(val, list):
+                pass
+        if pmap_default:
+            return g.new_vertex_property("vector<double>", val=new_val)
+        else:
+            return new_val
+
+def _convert_color(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
+    if isinstance(val, list):
+        new_val = val
+    elif isinstance(val, (tuple, np.ndarray)):
+        new_val = list(val)
+    elif isinstance(val, str):
+        new_val = list(color_converter.to_rgba(val))
+    elif isinstance(val, PropertyMap):
+        if val.value_type() in ["vector<double>", "vector<long double>"]:
             new_val = val
-        elif isinstance(val, (tuple, np.ndarray)):
-            new_val = list(val)
-        elif isinstance(val, str):
-            new_val = list(color_converter.to_rgba(val))
-        elif isinstance(val, PropertyMap):
-            if val.value_type() in ["vector<double>", "vector<long double>"]:
-                new_val = val
-            elif val.value_type() in ["int16_t", "int32_t", "int64_t", "double",
-                                      "long double", "unsigned long",
-                                      "unsigned int", "bool"]:
-                cmap, is_seq = choose_cm(val, cmap)
-                g = val.get_graph()
-                if val.value_type() in ["int16_t", "int32_t", "int64_t",
-                                        "unsigned long", "unsigned int"]:
-                    if not is_seq:
-                        nval = val.copy()
-                        nval.fa = rankdata(val.fa, method='dense') - 1
-                    else:
-                        nval = val
+        elif val.value_type() in ["int16_t", "int32_t", "int64_t", "double",
+                                  "long double", "unsigned long",
+                                  "unsigned int", "bool"]:
+            cmap, is_seq = choose_cm(val, cmap)
+            g = val.get_graph()
+            if val.value_type() in ["int16_t", "int32_t", "int64_t",
+                                    "unsigned long", "unsigned int"]:
+                if not is_seq:
+                    nval = val.copy()
+                    nval.fa = numpy.unique(val.fa, return_inverse=True)[1]
                 else:
                     nval = val
-                try:
-                    vrange = [nval.fa.min(), nval.fa.max()]
-                except (AttributeError, ValueError):
-                    #vertex index
-                    vrange = [int(g.vertex(0, use_index=False)),
-                              int(g.vertex(g.num_vertices() - 1,
-                                           use_index=False))]
-                if vnorm is None:
-                    if not is_seq:
-                        cnorm = lambda x : x % cmap.N
-                    else:
-                        cnorm = matplotlib.colors.Normalize(vmin=vrange[0],
-                                                            vmax=vrange[1])
+            else:
+                nval = val
+            try:
+                vrange = [nval.fa.min(), nval.fa.max()]
+            except (AttributeError, ValueError):
+                #vertex index
+                vrange = [int(g.vertex(0, use_index=False)),
+                          int(g.vertex(g.num_vertices() - 1,
+                                       use_index=False))]
+            if vnorm is None:
+                if not is_seq:
+                    cnorm = lambda x : x % cmap.N
                 else:
-                    cnorm = vnorm
-                    cnorm(vrange) # for auto-scale, if needed
+                    cnorm = matplotlib.colors.Normalize(vmin=vrange[0],
+                                                        vmax=vrange[1])
+            else:
+                cnorm = vnorm
+                cnorm(vrange) # for auto-scale, if needed
 
-                g = val.get_graph()
-                if val.key_type() == "v":
-                    prop = g.new_vertex_property("vector<double>")
-                else:
-                    prop = g.new_edge_property("vector<double>")
-                map_property_values(nval, prop, lambda x: cmap(cnorm(x),
-                                                               alpha=alpha))
-                new_val = prop
-            elif val.value_type() == "string":
-                g = val.get_graph()
-                if val.key_type() == "v":
-                    prop = g.new_vertex_property("vector<double>")
-                else:
-                    prop = g.new_edge_property("vector<double>")
-                map_property_values(val, prop,
-                                    lambda x: color_converter.to_rgba(x))
-                new_val = prop
+            g = val.get_graph()
+            if val.key_type() == "v":
+                prop = g.new_vertex_property("vector<double>")
             else:
-                raise ValueError("Invalid value for attribute %s: %s" %
-                                 (repr(attr), repr(val)))
-        if pmap_default and not isinstance(val, PropertyMap):
-            if attr in [vertex_attrs.color, vertex_attrs.fill_color,
-                        vertex_attrs.text_color, vertex_attrs.halo_color]:
-                val_a = numpy.zeros((g.num_vertices(),len(new_val)))
-                for i in range(len(new_val)):
-                    val_a[:, i] = new_val[i]
-                return g.new_vertex_property("vector<double>", val_a)
+                prop = g.new_edge_property("vector<double>")
+            x = nval.fa
+            if (x is not None and
+                isinstance(cmap, matplotlib.colors.Colormap) and
+                (vnorm is None or
+                 isinstance(vnorm, matplotlib.colors.Normalize))):
+                # map all values at once
+                prop.set_2d_array(numpy.asarray(cmap(cnorm(x),
+                                                     alpha=alpha)).T)
             else:
-                val_a = numpy.zeros((g.num_edges(), len(new_val)))
-                for i in range(len(new_val)):
-                    val_a[:,i] = new_val[i]
-                return g.new_edge_property("vector<double>", val_a)
+                map_property_values(nval, prop,
+                                    lambda x: cmap(cnorm(x), alpha=alpha))
+            new_val = prop
+        elif val.value_type() == "string":
+            g = val.get_graph()
+            if val.key_type() == "v":
+                prop = g.new_vertex_property("vector<double>")
+            else:
+                prop = g.new_edge_property("vector<double>")
+            rgba = {}
+            def conv(x):
+                c = rgba.get(x)
+                if c is None:
+                    c = rgba[x] = color_converter.to_rgba(x)
+                return c
+            map_property_values(val, prop, conv)
+            new_val = prop
         else:
-            return new_val
+            raise ValueError("Invalid value for attribute %s: %s" %
+                             (repr(attr), repr(val)))
+    if pmap_default and not isinstance(val, PropertyMap):
+        # constant value: filled in place, without a (N, 4) intermediate
+        if isinstance(attr, vertex_attrs):
+            return g.new_vertex_property("vector<double>", val=new_val)
+        else:
+            return g.new_edge_property("vector<double>", val=new_val)
+    else:
+        return new_val
 
+def _convert_default(attr, val, cmap, alpha, vnorm, pmap_default, g, k):
     if pmap_default and not isinstance(val, PropertyMap):
         if k == "v":
             new_val = g.new_vertex_property(_vtypes[attr], val=val)
         else:
             new_val = g.new_edge_property(_etypes[attr], val=val)
         return new_val
-
     return val
 
+# Per-attribute conversion functions. The vertex and edge enums overlap as
+# integers, so they need separate tables.
+_vconverters = {vertex_attrs.shape: _convert_shape,
+                vertex_attrs.surface: _convert_surface,
+                vertex_attrs.pie_colors: _convert_pie_colors}
+_econverters = {edge_attrs.start_marker: _convert_marker,
+                edge_attrs.mid_marker: _convert_marker,
+                edge_attrs.end_marker: _convert_marker}
+for a in [vertex_attrs.color, vertex_attrs.fill_color,
+          vertex_attrs.text_color, vertex_attrs.text_out_color,
+          vertex_attrs.halo_color]:
+    _vconverters[a] = _convert_color
+for a in [edge_attrs.color, edge_attrs.text_color, edge_attrs.text_out_color]:
+    _econverters[a] = _convert_color
+del a
+
+def _convert(attr, val, cmap, vnorm, pmap_default=False, g=None, k=None):
+    try:
+        cmap, alpha = cmap
+    except TypeError:
+        alpha = None
+    convs = _vconverters if isinstance(attr, vertex_attrs) else _econverters
+    return convs.get(attr, _convert_default)(attr, val, cmap, alpha, vnorm,
+                                             pmap_default, g, k)
+
 
-def _attrs(attrs, d, g, cmap, vnorm):
+def _attrs(attrs, d, g, cmap, vnorm, num_threads=1):
     nattrs = {}
     defaults = {}
+    pmaps = []
     for k, v in attrs.items():
         try:
             if d == "v":
-                attr = getattr(vertex_attrs, k)
+                attr = _vattrs[k]
             else:
-                attr = getattr(edge_attrs, k)
-        except AttributeError:
+                attr = _eattrs[k]
+        except KeyError:
             warnings.warn("Unknown attribute: " + str(k), UserWarning)
             continue
         if isinstance(v, PropertyMap):
-            nattrs[int(attr)] = _prop(d, g, _convert(attr, v, cmap, vnorm))
+            pmaps.append((attr, v))
         else:
             defaults[int(attr)] = _convert(attr, v, cmap, vnorm)
+    if num_threads > 1 and len(pmaps) > 1:
+        # the conversions of different property maps are independent
+        with concurrent.futures.ThreadPoolExecutor(num_threads) as ex:
+            vals = list(ex.map(lambda x: _convert(x[0], x[1], cmap, vnorm),
+                               pmaps))
+    else:
+        vals = [_convert(attr, v, cmap, vnorm) for attr, v in pmaps]
+    for (attr, v), val in zip(pmaps, vals):
+        nattrs[int(attr)] = _prop(d, g, val)
     return nattrs, defaults
 
+_defaults_cache = {}
+
+def _get_defaults(d):
+    # The default values are constants, so their conversion does not depend
+    # on the graph or the colormap, and only needs to be done once.
+    defs = _defaults_cache.get(d)
+    if defs is None:
+        defaults = _vdefaults if d == "v" else _edefaults
+        defs = _defaults_cache[d] = _attrs(defaults, d, None, None, None)[1]
+    return dict(defs)
+
 def _convert_props(props, d, g, cmap, vnorm, pmap_default=False):
     nprops = {}
     for k, v in props.items():
         try:
             if d == "v":
-                attr = getattr(vertex_attrs, k)
+                attr = _vattrs[k]
             else:
-                attr = getattr(edge_attrs, k)
-            nprops[k] = _convert(attr, v, cmap, vnorm, pmap_default=pmap_default,
-                                 g=g, k=d)
-        except AttributeError:
+                attr = _eattrs[k]
+        except KeyError:
             kind = "vertex" if d == k else "edge"
             warnings.warn(f"Unknown {kind} attribute: " + str(k), UserWarning)
             continue
+        nprops[k] = _convert(attr, v, cmap, vnorm, pmap_default=pmap_default,
+                             g=g, k=d)
     return nprops
 
 
@@ -560,26 +642,29 @@ def get_attr(attr, d, attrs, defaults):
 
 def position_parallel_edges(g, pos, loop_angle=float("nan"),
                             parallel_distance=1):
+    if g.num_edges() == 0:
+        return []
     lp = label_parallel_edges(GraphView(g, directed=False))
-    ll = label_self_loops(g)
+    if lp.fa.max() == 0:
+        # the self-loop labels are only needed if there are no parallel edges
+        ll = label_self_loops(g)
+        if ll.fa.max() == 0:
+            return []
+
     if isinstance(loop_angle, PropertyMap):
         angle = loop_angle
     else:
         angle = g.new_vertex_property("double", float(loop_angle))
 
     g = GraphView(g, directed=True)
-    if ((len(lp.fa) == 0 or lp.fa.max() == 0) and
-        (len(ll.fa) == 0 or ll.fa.max() == 0)):
-        return []
-    else:
-        spline = g.new_edge_property("vector<double>")
-        libgraph_tool_draw.put_parallel_splines(g._Graph__graph,
-                                                _prop("v", g, pos),
-                                                _prop("e", g, lp),
-                                                _prop("e", g, spline),
-                                                _prop("v", g, angle),
-                                                parallel_distance)
-        return spline
+    spline = g.new_edge_property("vector<double>")
+    libgraph_tool_draw.put_parallel_splines(g._Graph__graph,
+                                            _prop("v", g, pos),
+                                            _prop("e", g, lp),
+                                            _prop("e", g, spline),
+                                            _prop("v", g, angle),
+                                            parallel_distance)
+    return spline
 
 
 def parse_props(prefix, args):
@@ -594,10 +679,27 @@ def parse_props(prefix, args):
             others[k] = v
     return props, others
 
+def parse_all_props(args):
+    """Split ``args`` into vertex properties, edge properties and the remaining
+    arguments, in a single pass."""
+    vprops = {}
+    eprops = {}
+    others = {}
+    for k, v in args.items():
+        if v is None:
+            continue
+        if k.startswith("vertex_"):
+            vprops[k[7:]] = v
+        elif k.startswith("edge_"):
+            eprops[k[5:]] = v
+        else:
+            others[k] = v
+    return vprops, eprops, others
+
 def cairo_draw(g, pos, cr, vprops=None, eprops=None, vorder=None, eorder=None,
                nodesfirst=False, vcmap=None, vcnorm=None, ecmap=None,
                ecnorm=None, loop_angle=numpy.nan, parallel_distance=None, res=0,
-               max_render_time=-1, **kwargs):
+               max_render_time=-1, num_threads=1, **kwargs):
     r"""Draw a graph to a :mod:`cairo` context.
 
     Parameters
@@ -640,7 +742,9 @@ def cairo_draw(g, pos, cr, vprops=None, eprops=None, vorder=None, eorder=None,
         radially from the center of the layout.
     parallel_distance : float (optional, default: ``None``)
         Distance used between parallel edges. If not provided, it will be
-        determined automatically.
+        determined automatically from the vertex sizes and the current
+        transformation matrix. When drawing the same graph repeatedly, passing
+        a fixed value (or ``edge_control_points``) avoids this computation.
     bg_color : str or sequence (optional, default: ``None``)
         Background color. The default is transparent.
     res : float (optional, default: ``0.``):
@@ -649,6 +753,10 @@ def cairo_draw(g, pos, cr, vprops=None, eprops=None, vorder=None, eorder=None,
         If nonnegative, this function will return an iterator that will perform
         part of the drawing at each step, so that each iteration takes at most
         ``max_render_time`` milliseconds.
+    num_threads : int (optional, default: ``1``):
+        Number of threads used to convert the vertex and edge property maps
+        (e.g. applying color maps) before drawing. This is only worthwhile for
+        large graphs with several property maps.
     vertex_* : :class:`~graph_tool.VertexPropertyMap` or arbitrary types (optional, default: ``None``)
         Parameters following the pattern ``vertex_<prop-name>`` specify the
         vertex property with name ``<prop-name>``, as an alternative to the
@@ -673,10 +781,9 @@ def cairo_draw(g, pos, cr, vprops=None, eprops=None, vorder=None, eorder=None,
     vprops = {} if vprops is None else copy.copy(vprops)
     eprops = {} if eprops is None else copy.copy(eprops)
 
-    props, kwargs = parse_props("vertex", kwargs)
-    vprops.update(props)
-    props, kwargs = parse_props("edge", kwargs)
-    eprops.update(props)
+    vp, ep, kwargs = parse_all_props(kwargs)
+    vprops.update(vp)
+    eprops.update(ep)
     for k in kwargs:
         warnings.warn("Unknown parameter: " + k, UserWarning)
 
@@ -709,18 +816,13 @@ def cairo_draw(g, pos, cr, vprops=None, eprops=None, vorder=None, eorder=None,
             toffset = group_vector_property([xo, yo])
             vprops["text_offset"] = toffset
 
-    vattrs, vdefaults = _attrs(vprops, "v", g, vcmap, vcnorm)
-    eattrs, edefaults = _attrs(eprops, "e", g, ecmap, ecnorm)
-    vdefs = _attrs(_vdefaults, "v", g, vcmap, vcnorm)[1]
+    vattrs, vdefaults = _attrs(vprops, "v", g, vcmap, vcnorm, num_threads)
+    eattrs, edefaults = _attrs(eprops, "e", g, ecmap, ecnorm, num_threads)
+    vdefs = _get_defaults("v")
     vdefs.update(vdefaults)
-    edefs = _attrs(_edefaults, "e", g, ecmap, ecnorm)[1]
+    edefs = _get_defaults("e")
     edefs.update(edefaults)
 
-    if "control_points" not in eprops:
-        if parallel_distance is None:
-            parallel_distance = _defaults
-        eprops["control_points"] = position_parallel_edges(g, pos, loop_angle,
-                                                           parallel_distance)
     generator = libgraph_tool_draw.cairo_draw(g._Graph__graph,
                                               _prop("v", g, pos),
                                               _prop("v", g, vorder),
@@ -748,39 +850,194 @@ def color_contrast(color):
     return c
 
 def auto_colors(g, bg, pos, back):
-    if not isinstance(bg, PropertyMap):
+    if isinstance(bg, PropertyMap):
+        bg_a = bg.get_2d_array(range(4))
+    else:
         if isinstance(bg, str):
             bg = color_converter.to_rgba(bg)
-        bg = g.new_vertex_property("vector<double>", val=bg)
-    if not isinstance(pos, PropertyMap):
-        if pos == "centered":
-            pos = 0
-        pos = g.new_vertex_property("double", pos)
-    bg_a = bg.get_2d_array(range(4))
-    bgc_pos = numpy.zeros((g.num_vertices(), 5))
-    for i in range(4):
-        bgc_pos[:, i] = bg_a[i, :]
-    bgc_pos[:, 4] = pos.fa
-    bgc_pos = g.new_vertex_property("vector<double>", bgc_pos)
-    def conv(x):
-        bgc = x[:4]
-        p = x[4]
-        if p < 0:
-            return color_contrast(bgc)
-        else:
-            return color_contrast(back)
+        bg_a = numpy.array(bg, dtype="float")[:4, numpy.newaxis]
+    if isinstance(pos, PropertyMap):
+        pos = pos.fa
+    elif pos == "centered":
+        pos = 0
+    y = bg_a[0] * .299 + bg_a[1] * .587 + bg_a[2] * .114
+    bgc = bg_a.copy()
+    bgc[:3] = y < .5
+    back = color_contrast(numpy.array(color_converter.to_rgba(back)))
+    c_a = numpy.where(numpy.asarray(pos) < 0, bgc, back[:, numpy.newaxis])
     c = g.new_vertex_property("vector<double>")
-    map_property_values(bgc_pos, c, conv)
+    c.set_2d_array(numpy.broadcast_to(c_a, (4, g.num_vertices())))
     return c
 
 
+def _has_text(text):
+    # Whether any vertex or edge text is non-empty.
+    if isinstance(text, str):
+        return text != ""
+    if isinstance(text, PropertyMap) and text.value_type() == "string":
+        g = text.get_graph()
+        if text.key_type() == "v":
+            nonempty = g.new_vertex_property("bool")
+        else:
+            nonempty = g.new_edge_property("bool")
+        map_property_values(text, nonempty, len)
+        return bool(nonempty.fa.any())
+    return True
+
+def _has_marker(eprops, directed):
+    # Whether any edge marker will be drawn. Directed graphs get an end arrow
+    # by default (see cairo_draw()).
+    none = int(edge_marker.none)
+    for k in ["start_marker", "mid_marker", "end_marker"]:
+        default = "arrow" if k == "end_marker" and directed else "none"
+        m = eprops.get(k, default)
+        if isinstance(m, PropertyMap):
+            if m.value_type() == "string" or (m.fa != none).any():
+                return True
+        elif isinstance(m, str):
+            if m != "none":
+                return True
+        elif int(m) != none:
+            return True
+    return False
+
+def _scale_prop(p, c):
+    # Return a scaled copy of a scalar property map, or a scaled value.
+    if not isinstance(p, PropertyMap):
+        return p * c
+    g = p.get_graph()
+    if p.key_type() == "v":
+        q = g.new_vertex_property("double")
+    else:
+        q = g.new_edge_property("double")
+    # scale straight into the new map, without a temporary array; the
+    # unfiltered arrays have the same length, since both maps share the graph
+    numpy.multiply(p.a, c, out=q.a)
+    return q
+
+def _gpu_layout(g):
+    # ForceAtlas2 (Barnes-Hut) layout computed on the GPU with cugraph.
+    # Returns None if cugraph is not available.
+    try:
+        import cudf
+        import cugraph
+    except ImportError:
+        return None
+    vs = g.get_vertices()
+    N = len(vs)
+    idx = numpy.zeros(g.num_vertices(True), dtype="int64")
+    idx[vs] = numpy.arange(N)
+    es = idx[g.get_edges()]
+    # isolated vertices are not part of the result, and keep random positions
+    a = _get_numpy_rng().random((2, N)) * numpy.sqrt(N)
+    if len(es) > 0:
+        u = cugraph.Graph()
+        u.from_cudf_edgelist(cudf.DataFrame({"src": es[:, 0],
+                                             "dst": es[:, 1]}),
+                             source="src", destination="dst", renumber=False)
+        r = cugraph.force_atlas2(u).to_pandas()
+        i = r["vertex"].to_numpy()
+        a[0, i] = r["x"].to_numpy()
+        a[1, i] = r["y"].to_numpy()
+    pos = g.new_vertex_property("vector<double>")
+    pos.set_2d_array(a)
+    return pos
+
+def _default_layout(g, backend):
+    if backend == "gpu":
+        pos = _gpu_layout(g)
+        if pos is not None:
+            return pos
+        warnings.warn("cugraph is not available, falling back to sfdp_layout()",
+                      RuntimeWarning)
+    elif backend != "cpu":
+        raise ValueError("Invalid layout backend: " + str(backend))
+    return sfdp_layout(g)
+
+# mean distance between two uniformly random points in the unit square
+_square_mean_distance = (2 + numpy.sqrt(2) + 5 * numpy.log(1 + numpy.sqrt(2))) / 15
+
+_layout_cache = collections.OrderedDict()
+_layout_cache_size = 8
+
+def _cached_layout(g, cache, backend):
+    # Key the layout on the graph topology, so that the same graph (or an
+    # identical one) is only laid out once. This covers all the inputs of
+    # _default_layout(), which ignores property maps.
+    h = hashlib.sha1()
+    h.update(backend.encode())
+    h.update(b"d" if g.is_directed() else b"u")
+    h.update(numpy.ascontiguousarray(g.get_vertices()).tobytes())
+    h.update(numpy.ascontiguousarray(g.get_edges()).tobytes())
+    key = h.hexdigest()
+
+    a = _layout_cache.get(key)
+    fname = None
+    if a is None and isinstance(cache, (str, os.PathLike)):
+        fname = os.path.join(cache, key + ".npy")
+        try:
+            a = numpy.load(fname)
+        except (OSError, ValueError):
+            a = None
+    if a is None:
+        a = _default_layout(g, backend).get_2d_array([0, 1])
+        if fname is not None:
+            os.makedirs(cache, exist_ok=True)
+            numpy.save(fname, a)
+    _layout_cache[key] = a
+    _layout_cache.move_to_end(key)
+    while len(_layout_cache) > _layout_cache_size:
+        _layout_cache.popitem(last=False)
+
+    pos = g.new_vertex_property("vector<double>")
+    pos.set_2d_array(a)
+    return pos
+
+
+def _eps_surface(out, w, h):
+    srf = cairo.PSSurface(out, w, h)
+    srf.set_eps(True)
+    return srf
+
+def _svg_surface(out, w, h):
+    srf = cairo.SVGSurface(out, w, h)
+    srf.restrict_to_version(cairo.SVG_VERSION_1_2)
+    return srf
+
+# surface constructors for each output format
+_surface_types = {"pdf": cairo.PDFSurface,
+                  "ps": cairo.PSSurface,
+                  "eps": _eps_surface,
+                  "svg": _svg_surface,
+                  "png": lambda out, w, h: cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                                              w, h)}
+
+
+_inline_surface = None
+
+def _get_inline_surface(width, height):
+    # The image buffer used to rasterize vector output for inline display is
+    # kept between calls, and cleared before each use.
+    global _inline_surface
+    srf = _inline_surface
+    if (srf is None or srf.get_width() != width or
+        srf.get_height() != height):
+        srf = _inline_surface = cairo.ImageSurface(cairo.FORMAT_ARGB32,
+                                                   width, height)
+    else:
+        cr = cairo.Context(srf)
+        cr.set_operator(cairo.OPERATOR_CLEAR)
+        cr.paint()
+    return srf
+
 
 def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
                nodesfirst=False, output_size=(600, 600), fit_view=True,
                fit_view_ink=None, adjust_aspect=True, ink_scale=1,
                inline=has_draw_inline, inline_scale=2, mplfig=None,
                yflip=True, output=None, fmt="auto", bg_color=None,
-               antialias=None, **kwargs):
+               antialias=None, cache_layout=False, layout_backend="cpu",
+               **kwargs):
     r"""Draw a graph to screen or to a file using :mod:`cairo`.
 
     Parameters
@@ -818,8 +1075,11 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
         to figure out the bounding box, before the actual drawing is
         made. Otherwise, only the vertex positions will be used for this
         purpose. If the value is ``None``, then it will be assumed ``True`` for
-        networks of size 10,000 nodes or less, otherwise it will be assumed
-        ``False``.
+        networks of size 1,000 nodes or less. For larger networks, the bounding
+        box will instead be estimated from the vertex positions, sizes, pen
+        widths and texts, without drawing; this estimate does not account for
+        edge texts, markers, or curved edges (self-loops, parallel edges and
+        ``control_points``).
     adjust_aspect : bool (optional, default: ``True``)
         If ``True``, and ``fit_view == True`` the output size will be decreased
         in the width or height to remove empty spaces.
@@ -851,6 +1111,22 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
         Background color. The default is transparent.
     antialias : :class:`cairo.Antialias` (optional, default: ``None``)
         If supplied, this will set the antialising mode of the cairo context.
+    cache_layout : bool or str (optional, default: ``False``)
+        If ``True`` and ``pos`` is not given, the default layout is kept in
+        memory, and reused when a graph with the same topology is drawn again
+        with the same ``layout_backend``. If a directory name is given, the
+        layouts are also stored there, so that they persist between
+        sessions. Caching is disabled by default. The layouts are identified
+        only by the vertices, edges, directedness and ``layout_backend``, since
+        the default layout depends on nothing else; in particular, a cached
+        layout is reused even if the RNG has been seeded differently with
+        :func:`~graph_tool.seed_rng`, and the stored files are never
+        invalidated.
+    layout_backend : str (optional, default: ``"cpu"``)
+        Backend used to compute the layout if ``pos`` is not given. If
+        ``"cpu"``, :func:`sfdp_layout` is used. If ``"gpu"``, the ForceAtlas2
+        layout of `cugraph <https://github.com/rapidsai/cugraph>`_ is used
+        instead, if it is available. This is much faster for very large graphs.
     vertex_* : :class:`~graph_tool.VertexPropertyMap` or arbitrary types (optional, default: ``None``)
         Parameters following the pattern ``vertex_<prop-name>`` specify the
         vertex property with name ``<prop-name>``, as an alternative to the
@@ -1080,12 +1356,11 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
     vprops = vprops.copy() if vprops is not None else {}
     eprops = eprops.copy() if eprops is not None else {}
 
-    props, kwargs = parse_props("vertex", kwargs)
-    props = _convert_props(props, "v", g, kwargs.get("vcmap", None),
+    vp, ep, kwargs = parse_all_props(kwargs)
+    props = _convert_props(vp, "v", g, kwargs.get("vcmap", None),
                            kwargs.get("vcnorm", None))
     vprops.update(props)
-    props, kwargs = parse_props("edge", kwargs)
-    props = _convert_props(props, "e", g, kwargs.get("ecmap", None),
+    props = _convert_props(ep, "e", g, kwargs.get("ecmap", None),
                            kwargs.get("ecnorm", None))
     eprops.update(props)
 
@@ -1099,9 +1374,17 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
                 if "multilevel" not in kwargs:
                     kwargs["multilevel"] = True
             if "layout_K" not in kwargs:
-                kwargs["layout_K"] = _avg_edge_distance(g, pos) / 10
+                # The positions are uniformly random, so the average edge
+                # length is (very nearly) the mean distance between two random
+                # points in an L x L square, and does not need to be measured.
+                if g.num_edges() > 0:
+                    kwargs["layout_K"] = _square_mean_distance * L / 10
+                else:
+                    kwargs["layout_K"] = 1. / 10
+        elif cache_layout:
+            pos = _cached_layout(g, cache_layout, layout_backend)
         else:
-            pos = sfdp_layout(g)
+            pos = _default_layout(g, layout_backend)
     else:
         pos = g.own_property(pos)
         _check_prop_vector(pos, name="pos", floating=True)
@@ -1111,33 +1394,27 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
             if "update_layout" not in kwargs:
                 kwargs["update_layout"] = False
 
-    if "pen_width" in eprops and "marker_size" not in eprops:
-        pw = eprops["pen_width"]
-        if isinstance(pw, PropertyMap):
-            pw = pw.copy("double")
-            pw.fa *= 2.75
-            eprops["marker_size"] = pw
-        else:
-            eprops["marker_size"] = pw * 2.75
+    if ("pen_width" in eprops and "marker_size" not in eprops and
+        _has_marker(eprops, g.is_directed())):
+        eprops["marker_size"] = _scale_prop(eprops["pen_width"], 2.75)
 
     if "text" in eprops and "text_distance" not in eprops and "pen_width" in eprops:
-        pw = eprops["pen_width"]
-        if isinstance(pw, PropertyMap):
-            pw = pw.copy("double")
-            pw.fa *= 2
-            eprops["text_distance"] = pw
-        else:
-            eprops["text_distance"] = pw * 2
+        eprops["text_distance"] = _scale_prop(eprops["pen_width"], 2)
 
     if "text" in vprops and ("text_color" not in vprops or vprops["text_color"] == "auto"):
-        vcmap = kwargs.get("vcmap", None)
-        bg = _convert(vertex_attrs.fill_color,
-                      vprops.get("fill_color", _vdefaults["fill_color"]),
-                      vcmap, kwargs.get("vcnorm", None))
-        vprops["text_color"] = auto_colors(g, bg,
-                                           vprops.get("text_position",
-                                                      _vdefaults["text_position"]),
-                                           bg_color if bg_color is not None else [1., 1., 1., 1.])
+        if not _has_text(vprops["text"]):
+            # nothing will be drawn, so there is no need for contrast colors
+            vprops["text_color"] = _vdefaults["text_color"]
+        else:
+            vcmap = kwargs.get("vcmap", None)
+            bg = _convert(vertex_attrs.fill_color,
+                          vprops.get("fill_color", _vdefaults["fill_color"]),
+                          vcmap, kwargs.get("vcnorm", None))
+            back = bg_color if bg_color is not None else [1., 1., 1., 1.]
+            vprops["text_color"] = auto_colors(g, bg,
+                                               vprops.get("text_position",
+                                                          _vdefaults["text_position"]),
+                                               back)
 
     if mplfig is not None:
         ax = None
@@ -1148,11 +1425,9 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
         else:
             ax = mplfig
 
-        x, y = ungroup_vector_property(pos, [0, 1])
-        l, r = x.a.min(), x.a.max()
-        b, t = y.a.min(), y.a.max()
+        w, h = get_bb(g, pos)[2:]
 
-        adjust_default_sizes(g, (r - l, t - b), vprops, eprops, min_pen_width=0)
+        adjust_default_sizes(g, (w, h), vprops, eprops, min_pen_width=0)
 
         if ink_scale != 1:
             scale_ink(ink_scale, vprops, eprops, min_pen_width=0)
@@ -1198,8 +1473,13 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
                 pad = fit_view if fit_view is not True else 0.9
                 output_size = list(output_size)
                 if fit_view_ink is None:
-                    fit_view_ink = g.num_vertices() <= 1000
-                if fit_view_ink:
+                    fit_view_ink = g.num_vertices() <= 1000 or "estimate"
+                if fit_view_ink == "estimate":
+                    x, y, zoom = fit_to_view(get_ink_bb(g, pos, vprops, eprops),
+                                             output_size,
+                                             adjust_aspect=adjust_aspect,
+                                             pad=pad)
+                elif fit_view_ink:
                     x, y, zoom = fit_to_view_ink(g, pos, output_size, vprops,
                                                  eprops, adjust_aspect, pad=pad)
                 else:
@@ -1220,21 +1500,11 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
 
         if fmt == "auto":
             fmt = auto_fmt
-        if fmt == "pdf":
-            srf = cairo.PDFSurface(out, output_size[0], output_size[1])
-        elif fmt == "ps":
-            srf = cairo.PSSurface(out, output_size[0], output_size[1])
-        elif fmt == "eps":
-            srf = cairo.PSSurface(out, output_size[0], output_size[1])
-            srf.set_eps(True)
-        elif fmt == "svg":
-            srf = cairo.SVGSurface(out, output_size[0], output_size[1])
-            srf.restrict_to_version(cairo.SVG_VERSION_1_2)
-        elif fmt == "png":
-            srf = cairo.ImageSurface(cairo.FORMAT_ARGB32, output_size[0],
-                                     output_size[1])
-        else:
+        try:
+            new_surface = _surface_types[fmt]
+        except KeyError:
             raise ValueError("Invalid format type: " + fmt)
+        srf = new_surface(out, output_size[0], output_size[1])
 
         cr = cairo.Context(srf)
         if antialias is not None:
@@ -1271,14 +1541,12 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
                 img = IPython.display.SVG(data=out.getvalue())
             elif img is None:
                 inl_out = io.BytesIO()
-                inl_srf = cairo.ImageSurface(cairo.FORMAT_ARGB32,
-                                             output_size[0],
-                                             output_size[1])
+                inl_srf = _get_inline_surface(output_size[0], output_size[1])
                 inl_cr = cairo.Context(inl_srf)
                 inl_cr.set_source_surface(srf, 0, 0)
                 inl_cr.paint()
                 inl_srf.write_to_png(inl_out)
-                del inl_srf
+                del inl_cr
                 img = IPython.display.Image(data=inl_out.getvalue(),
                                             width=int(output_size[0]/inline_scale),
                                             height=int(output_size[1]/inline_scale))
@@ -1289,15 +1557,20 @@ def graph_draw(g, pos=None, vprops=None, eprops=None, vorder=None, eorder=None,
 
 def adjust_default_sizes(g, geometry, vprops, eprops, force=False,
                          min_pen_width=0.05):
+    if (not force and "font_size" in eprops and
+        all(k in vprops for k in ["size", "pen_width", "font_size"])):
+        return  # nothing to adjust
+
     if "size" not in vprops or force:
         A = geometry[0] * geometry[1]
         N = max(g.num_vertices(), 1)
         vprops["size"] = np.sqrt(A / N) / 3.5
 
+    size = vprops["size"]
+    if isinstance(size, PropertyMap):
+        size = size.fa.mean()
+
     if "pen_width" not in vprops or force:
-        size = vprops["size"]
-        if isinstance(vprops["size"], PropertyMap):
-            size = vprops["size"].fa.mean()
         vprops["pen_width"] = max(size / 10, min_pen_width)
         if "pen_width" not in eprops or force:
             eprops["pen_width"] = max(size / 10, min_pen_width)
@@ -1305,15 +1578,9 @@ def adjust_default_sizes(g, geometry, vprops, eprops, force=False,
             eprops["marker_size"] = size * 0.8
 
     if "font_size" not in vprops or force:
-        size = vprops["size"]
-        if isinstance(vprops["size"], PropertyMap):
-            size = vprops["size"].fa.mean()
         vprops["font_size"] =  size * .6
 
     if "font_size" not in eprops or force:
-        size = vprops["size"]
-        if isinstance(vprops["size"], PropertyMap):
-            size = vprops["size"].fa.mean()
         eprops["font_size"] =  size * .6
 
 
@@ -1329,12 +1596,21 @@ def scale_ink(scale, vprops, eprops, copy=True, min_pen_width=0.05):
                 props[p] = defaults[p]
             if isinstance(props[p], PropertyMap):
                 if copy:
-                    props[p] = props[p].copy()
-                props[p].fa *= scale
+                    # scale straight into a new map, instead of copying and
+                    # then scaling; the whole (unfiltered) array can be used
+                    # since the map is private
+                    x = props[p]
+                    props[p] = x.get_graph().new_property(x.key_type(),
+                                                          x.value_type())
+                    y = props[p].a
+                    np.multiply(x.a, scale, out=y)
+                else:
+                    y = props[p].fa
+                    y *= scale
                 if p == "pen_width":
-                    x = props[p].fa
-                    x[x<min_pen_width] = min_pen_width
-                    props[p].fa = x
+                    np.maximum(y, min_pen_width, out=y)
+                if not copy:
+                    props[p].fa = y
             else:
                 if copy:
                     props[p] = props[p] * scale
@@ -1345,9 +1621,58 @@ def scale_ink(scale, vprops, eprops, copy=True, min_pen_width=0.05):
                                    min_pen_width)
 
 def get_bb(g, pos):
-    pos_x, pos_y = ungroup_vector_property(pos, [0, 1])
-    x_range = [pos_x.fa.min(), pos_x.fa.max()]
-    y_range = [pos_y.fa.min(), pos_y.fa.max()]
+    # a single extraction of the coordinates, and one reduction per direction
+    a = pos.get_2d_array([0, 1])
+    lo, hi = a.min(axis=1), a.max(axis=1)
+    return lo[0], lo[1], hi[0] - lo[0], hi[1] - lo[1]
+
+def _prop_values(props, defaults, name):
+    p = props.get(name, defaults[name])
+    if isinstance(p, PropertyMap):
+        return p.fa
+    return p
+
+def get_ink_bb(g, pos, vprops, eprops):
+    """Estimate the ink bounding box from the vertex positions, sizes, pen
+    widths and texts, without drawing. Edge texts are not accounted for."""
+    x, y = pos.get_2d_array([0, 1])
+    size = numpy.asarray(_prop_values(vprops, _vdefaults, "size"), dtype="float")
+    aspect = numpy.asarray(_prop_values(vprops, _vdefaults, "aspect"),
+                           dtype="float")
+    halo = numpy.asarray(_prop_values(vprops, _vdefaults, "halo"), dtype="bool")
+    halo_size = numpy.asarray(_prop_values(vprops, _vdefaults, "halo_size"),
+                              dtype="float")
+    vpw = numpy.asarray(_prop_values(vprops, _vdefaults, "pen_width"),
+                        dtype="float")
+    epw = numpy.asarray(_prop_values(eprops, _edefaults, "pen_width"),
+                        dtype="float")
+    r = size / 2 * numpy.maximum(aspect, 1)
+    r = numpy.where(halo, r * numpy.maximum(halo_size, 1), r) + vpw / 2
+
+    text = vprops.get("text", "")
+    if _has_text(text):
+        # rough text width, from the number of characters
+        if isinstance(text, PropertyMap):
+            tl = g.new_vertex_property("int")
+            map_property_values(text, tl, lambda x: len(str(x)))
+            tl = tl.fa
+        else:
+            tl = len(str(text))
+        fs = numpy.asarray(_prop_values(vprops, _vdefaults, "font_size"),
+                           dtype="float")
+        tw = numpy.where(tl > 0, numpy.maximum(tl * fs * .6, fs), 0)
+        tpos = _prop_values(vprops, _vdefaults, "text_position")
+        if isinstance(tpos, str):
+            # "centered" texts are placed outside the vertices
+            tpos = 0
+        tpos = numpy.asarray(tpos, dtype="float")
+        # texts are either inside the vertex (which grows to fit them, if
+        # text_position == -1), or next to it
+        r = numpy.where(tpos < 0, numpy.maximum(r, tw / 2), r + tw)
+    r = numpy.broadcast_to(r, x.shape)
+    d = epw.max() / 2 if epw.size > 0 else 0
+    x_range = [(x - r).min() - d, (x + r).max() + d]
+    y_range = [(y - r).min() - d, (y + r).max() + d]
     return x_range[0], y_range[0], x_range[1] - x_range[0], y_range[1] - y_range[0]
 
 def fit_to_view(rec, output_size, adjust_aspect=False, pad=.9):
@@ -1392,10 +1717,10 @@ def fit_to_view_ink(g, pos, output_size, vprops, eprops, adjust_aspect=False,
     # work around cairo bug with small line widths
     def min_lw(lw):
         if isinstance(lw, PropertyMap):
-            lw = lw.copy()
-            x = lw.fa
-            x[x < 0.05] = 0.1
-            lw.fa = x
+            # one pass into a new map, instead of copying and then masking
+            x = lw.a
+            lw = lw.get_graph().new_property(lw.key_type(), lw.value_type())
+            lw.a = np.where(x < 0.05, 0.1, x)
         else:
             lw = max(lw, 0.1)
         return lw
@@ -1639,15 +1964,14 @@ class GraphArtist(matplotlib.artist.Artist):
         """Draw to a cairo context."""
         ctx.save()
 
-        pos = self.pos.copy()
         eprops = dict(self.eprops)
         vprops = dict(self.vprops)
 
         # clip region
         l, r = self.ax.get_xlim()
         b, t = self.ax.get_ylim()
-        l, b = transform((l, b))
-        r, t = transform((r, t))
+        l, b = map(float, transform((l, b)))
+        r, t = map(float, transform((r, t)))
         ctx.new_path()
         ctx.rectangle(min(l, r), min(b, t), abs(r-l), abs(t-b))
         ctx.clip()
@@ -1656,47 +1980,57 @@ class GraphArtist(matplotlib.artist.Artist):
              self.ax.transData.transform((0, 0)))
         scale_ink(np.mean(np.abs(d)) * mag, vprops, eprops, min_pen_width=0)
 
-        pos = pos.t(transform)
+        # transform all positions at once
+        x = self.pos.get_2d_array([0, 1])
+        pos = self.g.new_vertex_property("vector<double>")
+        pos.set_2d_array(np.array(transform(x.T)))
 
         # transform edge control points, if present
         cp = eprops.get("control_points", None)
         if isinstance(cp, PropertyMap):
-            ctx.save()
             cp = cp.copy()
+            # The control points are given relative to the edge, with the
+            # source at (0, 0) and the target at (1, 0). They are mapped to
+            # user coordinates, transformed, and mapped back relative to the
+            # transformed edge, for all edges at once.
+            es = []
+            cs = []
             for e in self.g.edges():
-                s = self.pos[e.source()].a
-                t = self.pos[e.target()].a
-                a = np.arctan2(t[1] - s[1],
-                               t[0] - s[0])
-                l = np.sqrt((t[1] - s[1]) ** 2 +
-                            (t[0] - s[0]) ** 2)
                 c = cp[e]
-                for i in range(len(c) // 2):
-                    x = c.a[i*2:(i+1)*2]
-                    ctx.identity_matrix()
-                    ctx.translate(s[0], s[1])
-                    ctx.rotate(a)
-                    ctx.scale(l, 1)
-                    x = ctx.user_to_device(x[0], x[1])
-                    x = transform(x)
-                    c.a[i*2:(i+1)*2] = x
-
-                s = pos[e.source()].a
-                t = pos[e.target()].a
-                a = np.arctan2(t[1] - s[1],
-                               t[0] - s[0])
-                l = np.sqrt((t[1] - s[1]) ** 2 +
-                            (t[0] - s[0]) ** 2)
-
-                for i in range(len(c) // 2):
-                    x = c.a[i*2:(i+1)*2]
-                    ctx.identity_matrix()
-                    ctx.scale(1/l, 1)
-                    ctx.rotate(-a)
-                    ctx.translate(-s[0], -s[1])
-                    x = ctx.user_to_device(x[0], x[1])
-                    c.a[i*2:(i+1)*2] = x
-            ctx.restore()
+                if len(c) > 1:
+                    es.append((int(e.source()), int(e.target())))
+                    cs.append(c)
+            if len(cs) > 0:
+                es = np.array(es)
+                ns = np.array([len(c) // 2 for c in cs])
+                x = np.concatenate([c.a[:2 * n] for c, n in zip(cs, ns)])
+                x = x.reshape(-1, 2)
+                idx = np.repeat(np.arange(len(cs)), ns)
+
+                def edge_frame(p):
+                    px, py = ungroup_vector_property(p, [0, 1])
+                    px, py = px.a, py.a
+                    sx, sy = px[es[:, 0]], py[es[:, 0]]
+                    dx, dy = px[es[:, 1]] - sx, py[es[:, 1]] - sy
+                    a = np.arctan2(dy, dx)
+                    l = np.sqrt(dx ** 2 + dy ** 2)
+                    return (sx[idx], sy[idx], np.cos(a)[idx],
+                            np.sin(a)[idx], l[idx])
+
+                sx, sy, ca, sa, l = edge_frame(self.pos)
+                u = x[:, 0] * l
+                y = np.array([sx + ca * u - sa * x[:, 1],
+                              sy + sa * u + ca * x[:, 1]])
+                y = np.array(transform(y.T))
+
+                sx, sy, ca, sa, l = edge_frame(pos)
+                dx, dy = y[0] - sx, y[1] - sy
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    x[:, 0] = (ca * dx + sa * dy) / l
+                x[:, 1] = ca * dy - sa * dx
+
+                for c, y in zip(cs, np.split(x, np.cumsum(ns)[:-1])):
+                    c.a[:len(y) * 2] = y.ravel()
             eprops["control_points"] = cp
 
         cairo_draw(self.g, pos, ctx, vprops, eprops, **self.kwargs)
@@ -1713,10 +2047,11 @@ class GraphArtist(matplotlib.artist.Artist):
             if not isinstance(ctx, cairo.Context):
                 ctx = _UNSAFE_cairocffi_context_to_pycairo(ctx)
 
-            # Cairo coordinates are flipped in the y direction
+            # Cairo coordinates are flipped in the y direction; x may be a
+            # single point or an (N, 2) array of points
             def transform(x):
                 x = self.ax.transData.transform(x)
-                return (x[0], height - x[1])
+                return (x[..., 0], height - x[..., 1])
 
             self.draw_to_cairo(ctx, transform)
         else:
@@ -1734,8 +2069,8 @@ class GraphArtist(matplotlib.artist.Artist):
 
             def transform(x):
                 x = self.ax.transData.transform(x)
-                x = ((x[0] - l) * width / (r - l),
-                     (x[1] - b) * height / (t - b))
+                x = ((x[..., 0] - l) * width / (r - l),
+                     (x[..., 1] - b) * height / (t - b))
                 return (x[0], height - x[1])
 
             self.draw_to_cairo(ctx, transform, mag)
@@ -1745,8 +2080,9 @@ class GraphArtist(matplotlib.artist.Artist):
             buf = img.get_data()
             im = np.ndarray(shape=(height, width, 4), dtype=np.uint8,
                             buffer=buf)
-            im[:, :, [0, 2]] = im[:, :, [2, 0]]  # fix endianess (swap R and B)
-            im = im[::-1, :, :]                  # flip y direction
+            # fix endianess (swap R and B) and flip y direction, in a single
+            # copy of the buffer
+            im = im[::-1, :, [2, 1, 0, 3]]
             gc = renderer.new_gc()
             renderer.draw_image(gc, l, b, im)
 
@@ -2110,16 +2446,26 @@ def draw_hierarchy(state, pos=None, layout="radial", beta=0.8, node_weight=None,
         ecolor = eprops.get("ecolor", _edefaults["color"])
         eprops["gradient"] = gradient
         if overlap:
-            for e in g.edges():                       # ******** SLOW *******
-                r, s = be[e]
-                if not g.is_directed() and e.source() > e.target():
-                    r, s = s, r
-                gradient[e] = [0] + list(vcmap(r / (B - 1))) + \
-                              [1] + list(vcmap(s / (B - 1)))
-                if isinstance(ecolor, PropertyMap):
-                    gradient[e][4] = gradient[e][9] = ecolor[e][3]
-                else:
-                    gradient[e][4] = gradient[e][9] = ecolor[3]
+            # build the gradient as a (10, E) array, in edge index order
+            r, s = be.get_2d_array([0, 1]).astype("int")
+            if not g.is_directed():
+                es = g.get_edges([g.edge_index])
+                es = es[es[:, 2].argsort()]
+                idx = es[:, 0] > es[:, 1]
+                r[idx], s[idx] = s[idx], r[idx]
+            M = len(r)
+            if isinstance(ecolor, PropertyMap):
+                alpha = ecolor.get_2d_array([3])[0]
+            else:
+                alpha = ecolor[3]
+            cr = numpy.asarray(vcmap(r / (B - 1))).reshape(M, -1).T
+            cs = numpy.asarray(vcmap(s / (B - 1))).reshape(M, -1).T
+            a = numpy.zeros((10, M))
+            a[1:5] = cr[:4]
+            a[5] = 1
+            a[6:10] = cs[:4]
+            a[4] = a[9] = alpha
+            gradient.set_2d_array(a, pos=range(10))
 
 
     t_orig = t
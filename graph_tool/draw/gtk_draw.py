@@ -268,10 +268,9 @@ class GraphWidget(Gtk.DrawingArea):
         vprops = {} if vprops is None else vprops
         eprops = {} if eprops is None else eprops
 
-        props, kwargs = parse_props("vertex", kwargs)
-        vprops.update(props)
-        props, kwargs = parse_props("edge", kwargs)
-        eprops.update(props)
+        vp, ep, kwargs = parse_all_props(kwargs)
+        vprops.update(vp)
+        eprops.update(ep)
         self.kwargs = kwargs
 
         self.g = g
@@ -404,10 +403,9 @@ class GraphWidget(Gtk.DrawingArea):
         vprops = {} if vprops is None else copy.copy(vprops)
         eprops = {} if eprops is None else copy.copy(eprops)
 
-        props, kwargs = parse_props("vertex", kwargs)
-        vprops.update(props)
-        props, kwargs = parse_props("edge", kwargs)
-        eprops.update(props)
+        vp, ep, kwargs = parse_all_props(kwargs)
+        vprops.update(vp)
+        eprops.update(ep)
 
         if pos is not None:
             self.pos = pos
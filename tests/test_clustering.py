@@ -0,0 +1,143 @@
+import numpy
+import pytest
+
+import graph_tool.clustering
+from graph_tool import Graph, GraphView, _prop
+from graph_tool.clustering import _gt, global_clustering, local_clustering, \
+    motifs, _global_clustering_sparse, _local_clustering_weighted, \
+    _motif_sort_key
+from graph_tool.generation import remove_parallel_edges
+
+
+def _random_graph(directed, N=200, E=800, seed=42):
+    """random multigraph, with self-loops and parallel edges"""
+    rng = numpy.random.default_rng(seed)
+    g = Graph(directed=directed)
+    g.add_vertex(N)
+    g.add_edge_list(rng.integers(0, N, size=(E, 2)))
+    # make sure there are some self-loops and parallel edges
+    g.add_edge_list([(0, 0), (1, 1), (2, 3), (2, 3), (3, 2)])
+    return g
+
+
+def _global_clustering_kernel(g, weight=None):
+    if g.is_directed():
+        g = GraphView(g, directed=False, skip_properties=True)
+    return _gt.global_clustering(g._Graph__graph, _prop("e", g, weight))
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("multigraph", [False, True])
+def test_global_clustering_sparse(directed, multigraph):
+    g = _random_graph(directed)
+    if not multigraph:
+        remove_parallel_edges(g)
+    u = GraphView(g, directed=False, skip_properties=True) if directed else g
+
+    c = _global_clustering_sparse(u)
+    c_ref = _global_clustering_kernel(g)
+    assert c[0] == pytest.approx(c_ref[0])
+    assert c[1] == pytest.approx(c_ref[1])
+    assert c[2:] == tuple(c_ref[2:])
+
+    assert global_clustering(g) == pytest.approx(c_ref[:2])
+    c, triangles, n = global_clustering(g, ret_counts=True)
+    assert (triangles, n) == tuple(c_ref[2:])
+
+
+def test_global_clustering_sparse_budget():
+    # a star has sum(k * k) ~ N^2, so the kernel is used
+    g = Graph(directed=False)
+    g.add_vertex(1000)
+    g.add_edge_list([(0, v) for v in range(1, 1000)] + [(1, 2)])
+    assert _global_clustering_sparse(g) is None
+    c_ref = _global_clustering_kernel(g)
+    assert global_clustering(g) == pytest.approx(c_ref[:2])
+
+
+def test_global_clustering_unit_weights():
+    g = _random_graph(False)
+    w = g.new_edge_property("double", val=1)
+    assert (global_clustering(g, weight=w) ==
+            pytest.approx(global_clustering(g)))
+
+
+def _local_clustering_kernel(g, weight=None):
+    c = g.new_vertex_property("double")
+    _gt.local_clustering(g._Graph__graph, _prop("v", g, c), _prop("e", g, weight))
+    return c.a
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_local_clustering_weighted(directed):
+    g = _random_graph(directed)
+    remove_parallel_edges(g)
+    w = g.new_edge_property("double")
+    w.a = numpy.random.default_rng(43).random(g.num_edges())
+
+    c_ref = _local_clustering_kernel(g, w)
+    assert _local_clustering_weighted(g, w) == pytest.approx(c_ref)
+    c = local_clustering(g, weight=w, undirected=False)
+    assert c.a == pytest.approx(c_ref)
+
+
+def test_local_clustering_weighted_budget():
+    # a star exceeds the budget for the sparse products, so the kernel is used
+    g = Graph(directed=False)
+    g.add_vertex(1000)
+    g.add_edge_list([(0, v) for v in range(1, 1000)] + [(1, 2)])
+    w = g.new_edge_property("double", val=.5)
+    c = local_clustering(g, weight=w)
+    assert c.a == pytest.approx(_local_clustering_kernel(g, w))
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("block_size", [1, 7, 1 << 22])
+def test_local_clustering_sampled_exact(monkeypatch, directed, block_size):
+    # with m >= d(d-1) for all vertices, all pairs of out-edges are enumerated,
+    # and the sampled estimate is exact, also for multigraphs
+    monkeypatch.setattr(graph_tool.clustering, "_sample_block_size",
+                        block_size)
+    g = _random_graph(directed)
+    m = int((g.get_out_degrees(g.get_vertices()) ** 2).max())
+    c = local_clustering(g, undirected=False, sampled=True, m=m)
+    assert c.a == pytest.approx(_local_clustering_kernel(g))
+
+
+def _motif_sort_reference(list_hist):
+    """the ordering used before the composite key, with three stable sorts"""
+    list_hist = list(list_hist)
+    list_hist.sort(key=lambda x: sorted([v.in_degree() for v in x[0].vertices()]))
+    list_hist.sort(key=lambda x: sorted([v.out_degree() for v in x[0].vertices()]))
+    list_hist.sort(key=lambda x: x[0].num_edges())
+    return list_hist
+
+
+@pytest.mark.parametrize("directed", [False, True])
+@pytest.mark.parametrize("k", [3, 4])
+def test_motif_order(directed, k):
+    g = _random_graph(directed, N=50, E=150)
+    ms, counts = motifs(g, k)
+    assert len(ms) > 1
+
+    hist = list(zip(ms, counts))
+    assert ([id(x[0]) for x in _motif_sort_reference(hist)] ==
+            [id(m) for m in ms])
+
+    # ties keep the input order in both cases
+    perm = numpy.random.default_rng(44).permutation(len(hist))
+    shuffled = [hist[i] for i in perm]
+    assert ([id(x[0]) for x in sorted(shuffled,
+                                      key=lambda x: _motif_sort_key(x[0]))] ==
+            [id(x[0]) for x in _motif_sort_reference(shuffled)])
+
+
+@pytest.mark.parametrize("directed", [False, True])
+def test_motif_sort_key(directed):
+    g = _random_graph(directed, N=50, E=150)
+    ms, counts = motifs(g, 4)
+    for m in ms:
+        assert _motif_sort_key(m) == (
+            m.num_edges(),
+            tuple(sorted([v.out_degree() for v in m.vertices()])),
+            tuple(sorted([v.in_degree() for v in m.vertices()])))
@@ -0,0 +1,29 @@
+import numpy
+import pytest
+
+from graph_tool.draw import graph_draw, random_layout
+from graph_tool.draw.cairo_draw import get_ink_bb
+from graph_tool.generation import lattice
+
+
+# the ink extent is measured by drawing for up to 1000 vertices, and estimated
+# with get_ink_bb() above that
+@pytest.mark.parametrize("shape", [[10, 10], [40, 30]])
+def test_graph_draw_centered_text(tmp_path, shape):
+    g = lattice(shape)
+    pos = random_layout(g)
+    graph_draw(g, pos=pos, vertex_text=g.vertex_index,
+               vertex_text_position="centered",
+               output=str(tmp_path / "out.png"))
+    assert (tmp_path / "out.png").stat().st_size > 0
+
+
+def test_get_ink_bb_centered_text():
+    g = lattice([10, 10])
+    pos = random_layout(g)
+    vprops = {"text": "abc", "text_position": "centered"}
+    x, y, w, h = get_ink_bb(g, pos, vprops, {})
+    px, py = pos.get_2d_array([0, 1])
+    assert numpy.isfinite([x, y, w, h]).all()
+    assert x < px.min() and y < py.min()
+    assert x + w > px.max() and y + h > py.max()